@@ -0,0 +1,241 @@
+"""
+benchmark.py
+
+Performance benchmarks for the golden model and the test-data pipeline:
+- decode   : every decoding path of golden_viterbi.py over a sweep of N, M and T
+             (reference = run_viterbi_for_sequence, batch = run_viterbi_batch,
+             numba = run_viterbi_compiled when numba is installed,
+             lowmem = run_viterbi_lowmem with sqrt(T) checkpoints);
+- load     : read_input_file / read_B_file on text and binary files;
+- generate : generate_all_test_data in text and binary format.
+
+Each case records the best wall time over --repeat runs, symbols (or words)
+per second, and the peak traced memory of one extra run (tracemalloc, which
+sees NumPy buffers). Results are saved as JSON; --compare OLD.json prints the
+speed ratio against an earlier run so regressions show up between commits.
+
+Usage:
+    python benchmark.py [--quick] [--repeat 3] [--groups decode,load,generate]
+                        [--output bench.json] [--compare old_bench.json]
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import generate_test_data
+import golden_viterbi
+
+# --- CONFIGURATION ---
+DECODE_N = (2, 8, 16, 31)
+DECODE_M = (4, 64, 511)
+DECODE_T = (16, 256, 4096)
+SYMBOLS_PER_CASE = 32768         # sequences per case = SYMBOLS_PER_CASE // T
+LOAD_WORDS = (1 << 14, 1 << 20)  # input.dat sizes for the loader benchmark
+GENERATE_CASES = ((4, 16, 100), (31, 33, 100), (31, 33, 10000))  # (N, M, sequences), lengths 1..20
+QUICK_SCALE = 8                  # --quick divides the workload sizes by this
+DEFAULT_OUTPUT = "bench.json"
+# --- END CONFIGURATION ---
+
+ENGINES = ("reference", "batch", "numba", "lowmem")
+
+# ---- measurement ----
+
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Best-of-`repeat` wall time of fn(), plus its peak traced allocation in one extra run."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(times), "seconds_median": float(np.median(times)), "peak_bytes": int(peak)}
+
+def random_model(rng: np.random.Generator, N: int, M: int):
+    """Random (A_start, A_trans, B) in the generator's distribution (no DUT size limits)."""
+    A = generate_test_data.random_log_matrix(rng, N + 1, N, "A")
+    B = generate_test_data.random_log_matrix(rng, N, M, "B")
+    return A[0], A[1:], B
+
+def decoder_for(engine: str, N: int, M: int, A_start, A_trans, B) -> Optional[Callable]:
+    """A callable decoding a list of sequences with `engine`, or None if it is unavailable."""
+    if engine == "reference":
+        return lambda seqs: [golden_viterbi.run_viterbi_for_sequence(s, N, M, A_start, A_trans, B)
+                             for s in seqs]
+    if engine == "batch":
+        return lambda seqs: golden_viterbi.run_viterbi_batch(seqs, N, M, A_start, A_trans, B)
+    if engine == "numba":
+        if golden_viterbi._viterbi_kernel_jit is None:
+            return None
+        return lambda seqs: [golden_viterbi.run_viterbi_compiled(s, N, M, A_start, A_trans, B)
+                             for s in seqs]
+    if engine == "lowmem":
+        return lambda seqs: [golden_viterbi.run_viterbi_lowmem(
+            s, N, M, A_start, A_trans, B, checkpoint_interval=max(1, int(len(s) ** 0.5)))
+            for s in seqs]
+    raise ValueError(f"Unknown engine '{engine}' (expected one of {', '.join(ENGINES)})")
+
+# ---- benchmark groups ----
+
+def bench_decode(rng: np.random.Generator, repeat: int, scale: int, engines) -> List[Dict]:
+    results = []
+    for N in DECODE_N:
+        for M in DECODE_M:
+            A_start, A_trans, B = random_model(rng, N, M)
+            for T in DECODE_T:
+                num_seqs = max(1, SYMBOLS_PER_CASE // scale // T)
+                seqs = [rng.integers(1, M + 1, size=T) for _ in range(num_seqs)]
+                symbols = T * num_seqs
+                for engine in engines:
+                    decoder = decoder_for(engine, N, M, A_start, A_trans, B)
+                    if decoder is None:
+                        continue
+                    if engine == "numba":
+                        decoder(seqs[:1])  # JIT compile outside the timed runs
+                    m = measure(lambda: decoder(seqs), repeat)
+                    results.append({"group": "decode", "case": engine, "N": N, "M": M, "T": T,
+                                    "sequences": num_seqs, "symbols": symbols,
+                                    "symbols_per_s": symbols / m["seconds"], **m})
+                    print(f"decode {engine:>9} N={N:<3} M={M:<4} T={T:<5} "
+                          f"{symbols / m['seconds']:>12.0f} sym/s  peak {m['peak_bytes'] / 1e6:8.2f} MB")
+    return results
+
+def bench_load(rng: np.random.Generator, repeat: int, scale: int, tmpdir: str) -> List[Dict]:
+    results = []
+    for n_words in LOAD_WORDS:
+        n_words = max(1024, n_words // scale)
+        words = generate_test_data.random_input_words(rng, 511, n_words // 11, 1, 20)
+        for fmt in ("text", "binary"):
+            path = os.path.join(tmpdir, f"input_{n_words}.{fmt}")
+            generate_test_data.write_words(path, words, fmt, pad=False)
+            m = measure(lambda: golden_viterbi.read_input_file(path), repeat)
+            results.append({"group": "load", "case": f"input-{fmt}", "words": int(words.size),
+                            "bytes": os.path.getsize(path),
+                            "words_per_s": words.size / m["seconds"], **m})
+            print(f"load   input-{fmt:<6} {words.size:>9} words {words.size / m['seconds']:>14.0f} words/s")
+    _, _, B = random_model(rng, 31, 511)
+    for fmt in ("text", "binary"):
+        path = os.path.join(tmpdir, f"B.{fmt}")
+        generate_test_data.write_words(path, B.ravel().view(np.uint32), fmt)
+        m = measure(lambda: golden_viterbi.read_B_file(path, 31, 511), repeat)
+        results.append({"group": "load", "case": f"B-{fmt}", "words": int(B.size),
+                        "bytes": os.path.getsize(path),
+                        "words_per_s": B.size / m["seconds"], **m})
+        print(f"load   B-{fmt:<10} {B.size:>9} words {B.size / m['seconds']:>14.0f} words/s")
+    return results
+
+def bench_generate(repeat: int, scale: int, tmpdir: str) -> List[Dict]:
+    results = []
+    cwd = os.getcwd()
+    os.chdir(tmpdir)  # generate_all_test_data writes into the current directory
+    try:
+        for N, M, num_seqs in GENERATE_CASES:
+            num_seqs = max(1, num_seqs // scale)
+            for fmt in ("text", "binary"):
+                def run():
+                    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                        return generate_test_data.generate_all_test_data(N, M, num_seqs, 1, 20,
+                                                                         fmt=fmt, seed=0)
+                m = measure(run, repeat)
+                results.append({"group": "generate", "case": fmt, "N": N, "M": M,
+                                "sequences": num_seqs, **m})
+                print(f"gen    {fmt:<6} N={N:<3} M={M:<4} seqs={num_seqs:<6} {m['seconds'] * 1e3:9.2f} ms")
+    finally:
+        os.chdir(cwd)
+    return results
+
+# ---- reporting ----
+
+def environment() -> Dict[str, str]:
+    """Metadata stored with the results: commit, interpreter and library versions."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        commit = ""
+    numba = golden_viterbi.numba
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "numba": numba.__version__ if numba is not None else "",
+        "machine": platform.platform(),
+        "cpus": str(os.cpu_count()),
+    }
+
+def result_key(r: Dict) -> tuple:
+    return tuple(r.get(k) for k in ("group", "case", "N", "M", "T", "sequences", "words"))
+
+def compare(old: Dict, new: Dict) -> None:
+    """Print old/new best-time ratios for cases present in both runs (>1 means faster now)."""
+    old_by_key = {result_key(r): r for r in old["results"]}
+    print(f"\nCompared with {old['environment'].get('commit') or 'previous run'} "
+          f"({old['environment'].get('timestamp', '?')}):")
+    for r in new["results"]:
+        prev = old_by_key.get(result_key(r))
+        if prev is None:
+            continue
+        ratio = prev["seconds"] / r["seconds"]
+        flag = "  <-- slower" if ratio < 0.9 else ""
+        label = " ".join(f"{k}={r[k]}" for k in ("N", "M", "T", "sequences", "words") if k in r)
+        print(f"  {r['group']:<8} {r['case']:<12} {label:<36} x{ratio:5.2f}{flag}")
+
+# ---- main flow ----
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark golden_viterbi decoding, loading and data generation")
+    ap.add_argument("--groups", default="decode,load,generate", help="comma-separated subset of decode, load, generate")
+    ap.add_argument("--engines", default=",".join(ENGINES), help="decoding paths to benchmark")
+    ap.add_argument("--repeat", type=int, default=3, help="timed runs per case (best is reported)")
+    ap.add_argument("--quick", action="store_true", help=f"divide workload sizes by {QUICK_SCALE}")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON results file")
+    ap.add_argument("--compare", default=None, metavar="OLD_JSON", help="print speed ratios against an earlier run")
+    args = ap.parse_args(argv)
+
+    groups = {g.strip() for g in args.groups.split(",") if g.strip()}
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    for e in engines:
+        if e not in ENGINES:
+            ap.error(f"unknown engine '{e}' (expected one of {', '.join(ENGINES)})")
+    scale = QUICK_SCALE if args.quick else 1
+
+    results: List[Dict] = []
+    with tempfile.TemporaryDirectory(prefix="viterbi_bench_") as tmpdir:
+        if "decode" in groups:
+            results += bench_decode(np.random.default_rng((args.seed, 0)), args.repeat, scale, engines)
+        if "load" in groups:
+            results += bench_load(np.random.default_rng((args.seed, 1)), args.repeat, scale, tmpdir)
+        if "generate" in groups:
+            results += bench_generate(args.repeat, scale, tmpdir)
+
+    report = {"environment": environment(), "repeat": args.repeat, "quick": args.quick,
+              "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
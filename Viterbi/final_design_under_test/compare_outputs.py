@@ -0,0 +1,141 @@
+"""
+compare_outputs.py
+
+Streaming, structured comparison of two output files (golden output_p.dat vs.
+simulator output.dat). Both files are parsed token by token into per-sequence
+records (state path, float32 log-probability, ffffffff terminator) and compared
+record by record; the comparison stops at the first differing sequence and
+reports its index, the first differing time step, and the ULP distance between
+the two log-probabilities. Memory use is bounded by the longest sequence, not
+by the file size.
+
+Usage:
+    python compare_outputs.py output_p.dat output.dat
+"""
+
+import itertools
+import sys
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+TERMINATOR = 0xFFFFFFFF
+
+class Divergence(NamedTuple):
+    """First difference between two output files.
+
+    kind is one of "path" (a state differs), "length" (one path is a prefix of
+    the other), "logprob" (paths equal, log-probabilities differ), "missing" /
+    "extra" (actual has fewer / more sequences) or "format" (a file could not
+    be parsed). step is the 0-based time step of the first differing state.
+    """
+    kind: str
+    sequence: int
+    step: Optional[int] = None
+    expected: Optional[int] = None
+    actual: Optional[int] = None
+    expected_logprob: Optional[int] = None
+    actual_logprob: Optional[int] = None
+    ulps: Optional[int] = None
+    message: str = ""
+
+# ---- parsing ----
+
+def iter_output_records(lines: Iterable[str]) -> Iterator[Tuple[List[int], int]]:
+    """Yield (path, log-prob bit pattern) per sequence from output-file lines.
+
+    Tokens are hex words; each sequence is its states, then the log-prob, then
+    ffffffff, and the file ends with a single 0. Raises ValueError on a bad
+    token, an empty record or a missing / misplaced final 0.
+    """
+    pending: List[int] = []
+    for lineno, line in enumerate(lines, 1):
+        for tok in line.split():
+            try:
+                word = int(tok, 16)
+            except ValueError:
+                raise ValueError(f"line {lineno}: invalid hex token '{tok}'")
+            if word != TERMINATOR:
+                pending.append(word)
+                continue
+            if not pending:
+                raise ValueError(f"line {lineno}: terminator without a log-probability")
+            yield pending[:-1], pending[-1]
+            pending = []
+    if pending != [0]:
+        raise ValueError("file does not end with ffffffff followed by a single 0 (truncated?)")
+
+def float32_ulp_distance(a: int, b: int) -> int:
+    """Number of representable float32 values between two bit patterns (sign-magnitude aware)."""
+    def ordered(bits: int) -> int:
+        return -(bits & 0x7FFFFFFF) if bits & 0x80000000 else bits
+    return abs(ordered(a) - ordered(b))
+
+# ---- comparison ----
+
+def _records_or_error(lines: Iterable[str], name: str) -> Iterator[Tuple[List[int], int]]:
+    try:
+        yield from iter_output_records(lines)
+    except ValueError as e:
+        raise ValueError(f"{name}: {e}")
+
+def compare_records(expected: Iterable[str], actual: Iterable[str]) -> Optional[Divergence]:
+    """Compare two output streams (iterables of lines); None if they match."""
+    index = -1
+    try:
+        pairs = itertools.zip_longest(_records_or_error(expected, "expected"),
+                                      _records_or_error(actual, "actual"))
+        for index, (exp, act) in enumerate(pairs):
+            if act is None:
+                return Divergence("missing", index, message="actual output ends early")
+            if exp is None:
+                return Divergence("extra", index, message="actual output has extra sequences")
+            (exp_path, exp_lp), (act_path, act_lp) = exp, act
+            lp = dict(expected_logprob=exp_lp, actual_logprob=act_lp,
+                      ulps=float32_ulp_distance(exp_lp, act_lp))
+            if exp_path != act_path:
+                step = next((t for t, (e, a) in enumerate(zip(exp_path, act_path)) if e != a), None)
+                if step is None:
+                    step = min(len(exp_path), len(act_path))
+                    return Divergence("length", index, step, len(exp_path), len(act_path), **lp,
+                                      message="path lengths differ")
+                return Divergence("path", index, step, exp_path[step], act_path[step], **lp)
+            if exp_lp != act_lp:
+                return Divergence("logprob", index, **lp)
+    except ValueError as e:
+        return Divergence("format", index + 1, message=str(e))
+    return None
+
+def compare_files(expected_path: str, actual_path: str) -> Optional[Divergence]:
+    """Compare two output files without loading them; None if they match."""
+    with open(expected_path, "r") as fe, open(actual_path, "r") as fa:
+        return compare_records(fe, fa)
+
+def describe(d: Divergence) -> str:
+    """One-line human-readable summary of a Divergence."""
+    parts = [f"sequence {d.sequence}"]
+    if d.kind == "path":
+        parts.append(f"time step {d.step}: expected state {d.expected}, actual state {d.actual}")
+    elif d.kind == "length":
+        parts.append(f"time step {d.step}: expected {d.expected} states, actual {d.actual}")
+    elif d.message:
+        parts.append(d.message)
+    if d.ulps is not None:
+        parts.append(f"log-prob expected {d.expected_logprob:08x}, actual {d.actual_logprob:08x} "
+                     f"({d.ulps} ULP)")
+    return f"{d.kind}: " + ", ".join(parts)
+
+# ---- main flow ----
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("Usage: python compare_outputs.py EXPECTED ACTUAL", file=sys.stderr)
+        return 2
+    d = compare_files(argv[0], argv[1])
+    if d is None:
+        print("Outputs match.")
+        return 0
+    print(describe(d))
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""
+fpadder_model.py
+
+Bit-accurate, vectorized NumPy model of the 2-stage FPadder32Pipelined adder
+(FPadder32Pipelined.bsv), plus a randomized screening / cross-check tool.
+
+The hardware adder is not an IEEE-754 adder, and the model reproduces its quirks:
+- the implicit leading 1 is always inserted, so exponent-0 (subnormal/zero)
+  operands are treated as normal numbers with exponent 0;
+- magnitudes are always added and the result takes the sign of operand a
+  (the Viterbi datapath only ever adds negative log-probabilities);
+- alignment keeps 3 guard bits plus a sticky bit, and rounding is
+  round-to-nearest-even on the 28-bit sum;
+- an operand with exponent 0xFF gives +/-Inf with a zero fraction (NaN in, Inf out),
+  and rounding into exponent 0xFF saturates to Inf;
+- the 8-bit exponent arithmetic wraps exactly like the Bit#(8) registers.
+
+Usage:
+    python fpadder_model.py [--count N] [--seed S] [--kind KIND]
+        Screens N random operand pairs: model vs. NumPy float32 addition.
+    python fpadder_model.py --bsv [--count N]
+        Also runs the same pairs through adder/mkTbVectors.bsv in Bluesim.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+_MASK23 = (1 << 23) - 1
+_MASK24 = (1 << 24) - 1
+
+# ---- adder model ----
+
+def fp_add_bits(a, b) -> np.ndarray:
+    """Add float32 bit patterns (uint32 arrays, broadcastable) exactly as mkFPadder32 does."""
+    a, b = np.broadcast_arrays(np.asarray(a, dtype=np.uint32), np.asarray(b, dtype=np.uint32))
+    a = a.astype(np.int64)
+    b = b.astype(np.int64)
+
+    # Stage 1 (put): align the smaller operand, keep a sticky bit, add magnitudes.
+    sign = (a >> 31) & 1
+    exp_a = (a >> 23) & 0xFF
+    exp_b = (b >> 23) & 0xFF
+    mant_a = ((1 << 23) | (a & _MASK23)) << 3          # Bit#(27) {1, frac, 000}
+    mant_b = ((1 << 23) | (b & _MASK23)) << 3
+    a_larger = exp_a > exp_b
+    exp_common = np.where(a_larger, exp_a, exp_b)
+    big = np.where(a_larger, mant_a, mant_b)
+    small = np.where(a_larger, mant_b, mant_a)
+    # Shifting a Bit#(27) by >= 27 clears it and (1 << d) - 1 wraps to all ones.
+    d = np.minimum(np.abs(exp_a - exp_b), 27)
+    sticky = (small & ((1 << d) - 1)) != 0
+    small = (small >> d) | sticky
+    mant_sum = big + small                                # Bit#(28)
+    exception = exp_common == 0xFF
+
+    # Stage 2 (normalize_no_deps): 1-bit normalize, round to nearest even.
+    carry = (mant_sum >> 27) & 1
+    sig24 = np.where(carry == 1, mant_sum >> 4, mant_sum >> 3) & _MASK24
+    g = np.where(carry == 1, mant_sum >> 3, mant_sum >> 2) & 1
+    r = np.where(carry == 1, mant_sum >> 2, mant_sum >> 1) & 1
+    s = np.where(carry == 1, (mant_sum >> 1) | mant_sum, mant_sum) & 1
+    new_exp = (exp_common + carry) & 0xFF
+    round_up = (g == 1) & ((r | s | (sig24 & 1)) == 1)
+    tmp = sig24 + round_up                                # Bit#(25)
+
+    rounded_over = ((tmp >> 24) & 1) == 1
+    inc_exp = (new_exp + 1) & 0xFF
+    exp_r = np.where(rounded_over, inc_exp, new_exp)
+    frac_r = np.where(rounded_over, (tmp >> 1) & _MASK23, tmp & _MASK23)
+    saturate = exp_r == 0xFF
+    frac_r = np.where(saturate | exception, 0, frac_r)
+    exp_r = np.where(exception, 0xFF, exp_r)
+
+    return ((sign << 31) | (exp_r << 23) | frac_r).astype(np.uint32)
+
+def fp_add(a, b) -> np.ndarray:
+    """float32 addition through the hardware adder model (drop-in for np.add on float32)."""
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    return fp_add_bits(a.view(np.uint32), b.view(np.uint32)).view(np.float32)
+
+# ---- reference vectors (adder/mkTb.bsv) ----
+
+MKTB_VECTORS: List[Tuple[int, int, int]] = [
+    (0xC0000000, 0xC0400000, 0xC0A00000),  # -2.0 + -3.0
+    (0xBFC00000, 0xBFC00000, 0xC0400000),  # -1.5 + -1.5
+    (0xF1B098A2, 0xF1B098A2, 0xF23098A2),  # -2.0e30 + -2.0e30
+    (0x830F2CB0, 0x830F2CB0, 0x838F2CB0),  # tiny + tiny
+    (0xFE249F2C, 0x8484196B, 0xFE249F2C),  # -1.0e38 + -1.0e-38
+    (0xBF800000, 0xB3800000, 0xBF800000),  # -1.0 + -2^-24 (tie, round to even)
+    (0xBF800001, 0xB3800000, 0xBF800002),  # -(1 + 2^-23) + -2^-24 (tie, round up)
+    (0xFF800000, 0xC0000000, 0xFF800000),  # -Inf + -2.0
+    (0xFF800000, 0xFF800000, 0xFF800000),  # -Inf + -Inf
+]
+
+def self_check() -> bool:
+    """Check the model against the hand-written mkTb.bsv vectors."""
+    vec = np.array(MKTB_VECTORS, dtype=np.uint32)
+    return bool(np.array_equal(fp_add_bits(vec[:, 0], vec[:, 1]), vec[:, 2]))
+
+# ---- randomized screening ----
+
+OPERAND_KINDS = ("logprob", "full", "subnormal", "overflow")
+
+def random_operands(rng: np.random.Generator, count: int, kind: str = "logprob") -> Tuple[np.ndarray, np.ndarray]:
+    """Draw `count` negative operand pairs as uint32 bit patterns.
+
+    logprob   : values like the golden model's path metrics (-1e9 .. 0)
+    full      : uniformly random negative bit patterns (any exponent, incl. Inf/NaN)
+    subnormal : at least one operand with exponent 0
+    overflow  : both operands near the top of the exponent range
+    """
+    sign = np.uint32(0x80000000)
+    if kind == "logprob":
+        mags = np.exp(rng.uniform(-10.0, np.log(1e9), size=(2, count))).astype(np.float32)
+        bits = (-mags).view(np.uint32)
+        return bits[0], bits[1]
+    bits = rng.integers(0, 1 << 31, size=(2, count), dtype=np.uint32) | sign
+    if kind == "full":
+        return bits[0], bits[1]
+    if kind == "subnormal":
+        bits[0] &= np.uint32(0x807FFFFF)
+        half = rng.random(count) < 0.5
+        bits[1, half] &= np.uint32(0x807FFFFF)
+        return bits[0], bits[1]
+    if kind == "overflow":
+        exps = rng.integers(0xF8, 0xFF, size=(2, count), dtype=np.uint32)
+        bits = (bits & np.uint32(0x807FFFFF)) | (exps << np.uint32(23))
+        return bits[0], bits[1]
+    raise ValueError(f"Unknown operand kind '{kind}' (expected one of {', '.join(OPERAND_KINDS)})")
+
+def screen_against_ieee(a: np.ndarray, b: np.ndarray) -> Dict[str, int]:
+    """Count where the hardware model and NumPy float32 addition disagree, by cause."""
+    model = fp_add_bits(a, b)
+    with np.errstate(over="ignore", invalid="ignore"):
+        ieee = (a.view(np.float32) + b.view(np.float32)).view(np.uint32)
+    diff = model != ieee
+    exp_a = (a >> np.uint32(23)) & np.uint32(0xFF)
+    exp_b = (b >> np.uint32(23)) & np.uint32(0xFF)
+    special = (exp_a == 0xFF) | (exp_b == 0xFF)
+    subnormal = ~special & ((exp_a == 0) | (exp_b == 0))
+    overflow = ~special & ~subnormal & (((ieee >> np.uint32(23)) & np.uint32(0xFF)) == 0xFF)
+    other = ~special & ~subnormal & ~overflow
+    return {
+        "total": int(a.size),
+        "mismatch": int(diff.sum()),
+        "mismatch_special": int((diff & special).sum()),
+        "mismatch_subnormal": int((diff & subnormal).sum()),
+        "mismatch_overflow": int((diff & overflow).sum()),
+        "mismatch_rounding": int((diff & other).sum()),
+    }
+
+# ---- Bluesim cross-check (adder/mkTbVectors.bsv) ----
+
+ADDER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "adder")
+BSV_VECTOR_FILE = "vectors.dat"
+BSV_MAX_VECTORS = 65535 # Must match MaxVectors in mkTbVectors.bsv
+BSV_SIM_COMMAND = ["make", "b_sim", "TOPFILE=mkTbVectors.bsv", "TOPMODULE=mkTbVectors"]
+BSV_SIM_TIMEOUT_SECONDS = 600
+
+def write_bsv_vectors(path: str, a: np.ndarray, b: np.ndarray, expected: np.ndarray) -> None:
+    """Write the count word followed by (a, b, expected) hex triples for mkRegFileLoad."""
+    words = np.concatenate(([len(a)], np.stack([a, b, expected], axis=1).ravel())).astype(np.uint32)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(f"{w:08x}\n" for w in words.tolist()))
+
+def run_bsv_crosscheck(a: np.ndarray, b: np.ndarray, adder_dir: str = ADDER_DIR) -> int:
+    """Run operand pairs through the Bluesim adder in chunks; return the number of mismatches."""
+    mismatches = 0
+    for start in range(0, len(a), BSV_MAX_VECTORS):
+        ca, cb = a[start:start + BSV_MAX_VECTORS], b[start:start + BSV_MAX_VECTORS]
+        write_bsv_vectors(os.path.join(adder_dir, BSV_VECTOR_FILE), ca, cb, fp_add_bits(ca, cb))
+        result = subprocess.run(BSV_SIM_COMMAND, capture_output=True, text=True,
+                                timeout=BSV_SIM_TIMEOUT_SECONDS, cwd=adder_dir)
+        if result.returncode != 0 or ("SUCCESS" not in result.stdout and "FAILURE" not in result.stdout):
+            raise RuntimeError(f"Adder simulation failed:\n{result.stdout}\n{result.stderr}")
+        for line in result.stdout.splitlines():
+            if line.startswith("MISMATCH"):
+                print(f"  chunk@{start}: {line}")
+        m = re.search(r"FAILURE:\s*(\d+)", result.stdout)
+        mismatches += int(m.group(1)) if m else 0
+    return mismatches
+
+# ---- main flow ----
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Screen the FPadder32Pipelined model against IEEE float32 and/or Bluesim")
+    ap.add_argument("--count", type=int, default=1_000_000, help="operand pairs per kind")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--kind", choices=OPERAND_KINDS + ("all",), default="all")
+    ap.add_argument("--bsv", action="store_true", help="also cross-check against adder/mkTbVectors.bsv in Bluesim")
+    args = ap.parse_args(argv)
+
+    if not self_check():
+        print("Model FAILS the mkTb.bsv reference vectors.", file=sys.stderr)
+        return 1
+    print("Model matches the mkTb.bsv reference vectors.")
+
+    rng = np.random.default_rng(args.seed)
+    kinds = OPERAND_KINDS if args.kind == "all" else (args.kind,)
+    status = 0
+    for kind in kinds:
+        a, b = random_operands(rng, args.count, kind)
+        stats = screen_against_ieee(a, b)
+        print(f"[{kind}] " + ", ".join(f"{k}={v}" for k, v in stats.items()))
+        if args.bsv:
+            bad = run_bsv_crosscheck(a, b)
+            print(f"[{kind}] Bluesim vs model: {bad} mismatches")
+            status |= bad != 0
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
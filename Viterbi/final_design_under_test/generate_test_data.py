@@ -3,6 +3,8 @@ import random
 import math
 import sys
 
+import numpy as np
+
 # --- SETTINGS ---
 # This block is now GONE. Parameters are passed in
 # via the generate_all_test_data function.
@@ -114,14 +116,99 @@ def write_input_dat_text(filename, M, num_seqs, min_len, max_len):
     print(f"Wrote {filename} ({count} sequences, len {min_len}-{max_len}, text/hex format)")
 
 
+# --- Vectorized (NumPy) generator ---
+# Same distributions as the write_*_dat_text functions above (uniform + 1e-9,
+# normalized to log-probabilities; uniform observations and lengths), but each
+# matrix / observation stream is drawn in one call and written in one bulk write.
+
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+def normalize_log_rows(probs):
+    """Row-wise vectorized normalize_log for a 2-D array of positive weights."""
+    probs = np.asarray(probs, dtype=np.float64)
+    if probs.shape[1] == 1:
+        return np.full(probs.shape, math.log(1.0 - 1e-7))
+    total = probs.sum(axis=1, keepdims=True)
+    norm_p = probs / np.where(total == 0, 1.0, total)
+    norm_p = np.where(norm_p >= 1.0, 1.0 - 1e-7, norm_p)  # Safeguard
+    with np.errstate(divide="ignore"):
+        log_probs = np.where(probs <= 0, -1e9, np.log(norm_p))  # Large negative, not -inf
+    uniform = math.log(1.0 / probs.shape[1])
+    return np.where(total == 0, uniform, log_probs)
+
+def random_log_matrix(rng, rows, cols, what):
+    """Draws a (rows x cols) float32 matrix of normalized log-probabilities."""
+    log_probs = normalize_log_rows(rng.random((rows, cols)) + 1e-9).astype(np.float32)
+    if (log_probs >= 0).any():
+        print(f"Error: {what} generator produced a non-negative value (>= 0). Aborting.")
+        raise ValueError(f"{what} log-prob >= 0")
+    return log_probs
+
+def quantize_log_matrix(log_probs, levels, rng=None, jitter_ulps=0):
+    """Rounds log-probabilities to multiples of 1/levels (kept < 0), so path
+    metrics collide and the decoder sees exact ties. With jitter_ulps, each
+    entry is then moved 0..jitter_ulps float32 ULPs further from zero (drawn
+    from rng), so many of those collisions become near ties instead."""
+    q = np.round(np.asarray(log_probs, dtype=np.float64) * levels) / levels
+    q = np.minimum(q, -1.0 / levels).astype(np.float32)
+    if jitter_ulps:
+        q = (q.view(np.int32) + rng.integers(0, jitter_ulps + 1, size=q.shape, dtype=np.int32)).view(np.float32)
+    return q
+
+def random_input_words(rng, M, num_seqs, min_len, max_len):
+    """Draws a full input.dat word stream: sequences, ffffffff terminators and the final 0."""
+    lengths = rng.integers(min_len, max_len + 1, size=num_seqs)
+    obs = rng.integers(1, M + 1, size=int(lengths.sum()), dtype=np.uint32) # Observations are 1-based
+    words = np.insert(obs, np.cumsum(lengths), np.uint32(0xFFFFFFFF))
+    return np.append(words, np.uint32(0))
+
+def hex_lines(words, pad=True):
+    """Formats uint32 words as newline-terminated lowercase hex (8 digits, or minimal width)."""
+    words = np.asarray(words, dtype=np.uint32)
+    shifts = np.arange(28, -1, -4, dtype=np.uint32)
+    nibbles = (words[:, None] >> shifts) & 0xF
+    chars = np.empty((words.size, 9), dtype=np.uint8)
+    chars[:, :8] = _HEX_DIGITS[nibbles]
+    chars[:, 8] = ord("\n")
+    if pad:
+        return chars.tobytes()
+    # Keep only the significant digits (at least one) plus the newline.
+    n_digits = np.maximum(1, 8 - (np.cumprod(nibbles == 0, axis=1).sum(axis=1)))
+    keep = np.arange(9)[None, :] >= (8 - n_digits)[:, None]
+    return chars[keep].tobytes()
+
+def write_words(filename, words, fmt="text", pad=True):
+    """Writes uint32 words in one bulk write, as hex text lines or raw little-endian binary."""
+    if fmt == "binary":
+        data = np.asarray(words, dtype="<u4").tobytes()
+    elif fmt == "text":
+        data = hex_lines(words, pad=pad)
+    else:
+        raise ValueError(f"Unknown output format '{fmt}' (expected 'text' or 'binary')")
+    with open(filename, 'wb') as f:
+        f.write(data)
+
+
 # --- Main execution ---
 # This is the new main function that the verification script will call.
-def generate_all_test_data(N, M, num_sequences, min_seq_len, max_seq_len):
+def generate_all_test_data(N, M, num_sequences, min_seq_len, max_seq_len,
+                           fmt="text", seed=None, tie_levels=None, tie_ulps=0):
     """
     Generates all .dat files based on the provided parameters.
     This function is called by verification_script.py
+
+    fmt="text" writes the hex text format the BSV testbench loads;
+    fmt="binary" writes raw little-endian words (golden model only).
+    seed seeds the NumPy generator; when None it is drawn from the global
+    `random` module, so random.seed() still makes runs reproducible.
+
+    tie_levels quantizes A and B to multiples of 1/tie_levels (tie-prone data);
+    tie_ulps then jitters every entry by up to that many ULPs (near-tie data).
+
+    Returns the generated arrays (N, M, A_start, A_trans, B, input_words) so
+    callers can feed the golden model without re-reading the files.
     """
-    print("--- Generating Random Test Data (Text Format) ---")
+    print(f"--- Generating Random Test Data ({fmt.capitalize()} Format) ---")
     
     # Check constraints (these are now checked in the main script,
     # but we can double-check here)
@@ -132,18 +219,41 @@ def generate_all_test_data(N, M, num_sequences, min_seq_len, max_seq_len):
     if min_seq_len > max_seq_len:
         raise ValueError("MIN_SEQ_LEN cannot be greater than MAX_SEQ_LEN.")
         
+    if seed is None:
+        seed = random.getrandbits(64)
+    print(f"Seed: {seed}")
+    rng = np.random.default_rng(seed)
+    label = "text/hex format" if fmt == "text" else "binary format"
+
     # Generate the files
-    write_n_dat_text("N.dat", N, M)
-    write_a_dat_text("A.dat", N)
-    write_b_dat_text("B.dat", N, M)
-    write_input_dat_text(
-        "input.dat", 
-        M, 
-        num_sequences, 
-        min_seq_len, 
-        max_seq_len
-    )
+    write_words("N.dat", [N, M], fmt, pad=False)
+    print(f"Wrote N.dat (N={N:x}, M={M:x}) ({label})")
+
+    A = np.vstack([random_log_matrix(rng, 1, N, "A.dat (q0)"),
+                   random_log_matrix(rng, N, N, "A.dat (q1..qN)")])
+    if tie_levels:
+        A = quantize_log_matrix(A, tie_levels, rng, tie_ulps)
+    write_words("A.dat", A.ravel().view(np.uint32), fmt)
+    print(f"Wrote A.dat (({N+1} x {N}) random matrix) ({label})")
+
+    B = random_log_matrix(rng, N, M, "B.dat")
+    if tie_levels:
+        B = quantize_log_matrix(B, tie_levels, rng, tie_ulps)
+    write_words("B.dat", B.ravel().view(np.uint32), fmt)
+    print(f"Wrote B.dat ({N} x {M} random matrix) ({label})")
+
+    words = random_input_words(rng, M, num_sequences, min_seq_len, max_seq_len)
+    write_words("input.dat", words, fmt, pad=False)
+    print(f"Wrote input.dat ({num_sequences} sequences, len {min_seq_len}-{max_seq_len}, {label})")
     print("--- Random Data Generation Complete ---")
+    return {
+        "N": N,
+        "M": M,
+        "A_start": A[0],
+        "A_trans": A[1:],
+        "B": B,
+        "input_words": words,
+    }
 
 
 # This block is for running this file standalone for debugging
@@ -155,6 +265,7 @@ if __name__ == "__main__":
     Num_Seq_debug = 5
     Min_Len_debug = 1
     Max_Len_debug = 10
+    Seed_debug = None # Set to the seed logged for a failing batch to regenerate it
     
     try:
         generate_all_test_data(
@@ -162,7 +273,8 @@ if __name__ == "__main__":
             M_debug, 
             Num_Seq_debug, 
             Min_Len_debug, 
-            Max_Len_debug
+            Max_Len_debug,
+            seed=Seed_debug
         )
     except Exception as e:
         print(f"Standalone run failed: {e}")
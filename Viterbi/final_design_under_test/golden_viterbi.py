@@ -1,250 +1,1336 @@
-"""
-viterbi_decoder.py
-
-Usage: put N.dat, A.dat, B.dat, Input.dat in the same directory and run:
-    python viterbi_decoder.py
-
-Writes Output.dat.
-
-Assumptions & formats:
-- N.dat : two integers (N and M) as text (one per line) OR two 32-bit ints in binary.
-- A.dat : (N+1)*N IEEE-754 float32 words (binary) OR whitespace/line hex/dec values.
-    Order: first N words = transitions from start q0 -> q1..qN (a0j),
-           remaining N*N words = a_ij in row-major with i=1..N, j=1..N.
-- B.dat : N*M IEEE-754 float32 words in order b1(o1)..b1(oM), b2(o1)..bN(oM).
-- Input.dat: sequence of 32-bit integers (binary or text). Sequences separated by 0xFFFFFFFF.
-    File ends with 0xFFFFFFFF followed by 0x0.
-- Output.dat: for each input sequence, write the most probable state (one per line),
-    then the log-probability as IEEE-754 float32 hex (8 lowercase hex digits), then ffffffff.
-    Final file ends with a line containing 0.
-"""
-
-import struct
-import os
-import sys
-from typing import List, Tuple
-import numpy as np
-
-# ---- helpers for flexible reading ----
-
-def try_read_all_as_binary_words(path: str) -> List[int]:
-    """Read file as sequence of 32-bit words (unsigned ints) in little-endian if possible."""
-    with open(path, "rb") as f:
-        data = f.read()
-    if len(data) % 4 != 0:
-        raise ValueError("Binary length is not multiple of 4")
-    return list(struct.unpack("<" + "I" * (len(data) // 4), data))
-
-def try_read_all_as_binary_floats(path: str) -> List[float]:
-    with open(path, "rb") as f:
-        data = f.read()
-    if len(data) % 4 != 0:
-        raise ValueError("Binary length is not multiple of 4")
-    return list(struct.unpack("<" + "f" * (len(data) // 4), data))
-
-def parse_text_words(path: str) -> List[str]:
-    """Return whitespace-separated tokens from text file."""
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read().split()
-
-def parse_token_as_int(tok: str) -> int:
-    tok = tok.strip()
-    if tok.lower().startswith("0x"):
-        return int(tok, 16)
-    try:
-        return int(tok, 16)
-    except Exception:
-        return int(tok, 10)
-
-def parse_token_as_float_from_hex_or_dec(tok: str) -> float:
-    tok = tok.strip()
-    if tok.lower().startswith("0x"):
-        ui = int(tok, 16)
-        return struct.unpack("<f", struct.pack("<I", ui))[0]
-    try:
-        ui = int(tok, 16)
-        return struct.unpack("<f", struct.pack("<I", ui))[0]
-    except Exception:
-        return float(tok)
-
-# ---- reading specific files ----
-
-def read_N_file(path: str) -> Tuple[int, int]:
-    try:
-        words = try_read_all_as_binary_words(path)
-        if len(words) >= 2:
-            return int(words[0]), int(words[1])
-    except Exception:
-        pass
-    toks = parse_text_words(path)
-    if len(toks) < 2:
-        raise RuntimeError(f"Could not parse N/M from {path}")
-    return int(parse_token_as_int(toks[0])), int(parse_token_as_int(toks[1]))
-
-def read_A_file(path: str, N: int) -> Tuple[np.ndarray, np.ndarray]:
-    floats = None
-    try:
-        floats = try_read_all_as_binary_floats(path)
-    except Exception:
-        pass
-    if floats is None or len(floats) != (N + 1) * N:
-        toks = parse_text_words(path)
-        if len(toks) != (N + 1) * N:
-            try:
-                words = try_read_all_as_binary_words(path)
-                if len(words) == (N + 1) * N:
-                    floats = [struct.unpack("<f", struct.pack("<I", w))[0] for w in words]
-                else:
-                    if len(toks) >= (N + 1) * N:
-                        floats = [parse_token_as_float_from_hex_or_dec(t) for t in toks[: (N + 1) * N]]
-                    else:
-                        raise RuntimeError(f"A.dat doesn't have expected {(N + 1) * N} entries (found {len(toks)})")
-            except Exception as e:
-                raise RuntimeError(f"Unable to parse {path}: {e}")
-        else:
-            floats = [parse_token_as_float_from_hex_or_dec(t) for t in toks]
-
-    arr = np.array(floats, dtype=np.float32)
-    A_start = arr[:N].astype(np.float32)
-    A_trans = arr[N:].reshape((N, N)).astype(np.float32)
-    return A_start, A_trans
-
-def read_B_file(path: str, N: int, M: int) -> np.ndarray:
-    floats = None
-    try:
-        floats = try_read_all_as_binary_floats(path)
-    except Exception:
-        pass
-    if floats is None or len(floats) != N * M:
-        toks = parse_text_words(path)
-        if len(toks) != N * M:
-            try:
-                words = try_read_all_as_binary_words(path)
-                if len(words) == N * M:
-                    floats = [struct.unpack("<f", struct.pack("<I", w))[0] for w in words]
-                else:
-                    if len(toks) >= N * M:
-                        floats = [parse_token_as_float_from_hex_or_dec(t) for t in toks[: N * M]]
-                    else:
-                        raise RuntimeError(f"B.dat doesn't have expected {N * M} entries (found {len(toks)})")
-            except Exception as e:
-                raise RuntimeError(f"Unable to parse {path}: {e}")
-        else:
-            floats = [parse_token_as_float_from_hex_or_dec(t) for t in toks]
-
-    return np.array(floats, dtype=np.float32).reshape((N, M))
-
-def read_input_file(path: str) -> List[List[int]]:
-    seqs: List[List[int]] = []
-    try:
-        toks = parse_text_words(path)
-        ints = [parse_token_as_int(t) for t in toks]
-        cur, i = [], 0
-        while i < len(ints):
-            w = ints[i]; i += 1
-            if w == 0xFFFFFFFF:
-                if i < len(ints) and ints[i] == 0:
-                    if cur:
-                        seqs.append(cur.copy())
-                    cur = []
-                    break
-                else:
-                    if cur: # Don't append empty lists if there are consecutive ffff...
-                        seqs.append(cur.copy())
-                    cur = []
-            else:
-                cur.append(int(w))
-        # Add this check to fix the *other* bug (see below)
-        if cur:
-             seqs.append(cur)
-        return seqs
-    except Exception as e:
-        raise RuntimeError(f"Failed to parse input.dat as text: {e}")
-
-# ---- Viterbi algorithm ----
-
-def run_viterbi_for_sequence(obs: List[int], N: int, M: int,
-                             A_start: np.ndarray, A_trans: np.ndarray, B: np.ndarray) -> Tuple[List[int], float]:
-    if len(obs) == 0:
-        return [], float("-inf")
-    oidx = [o - 1 for o in obs]
-    T = len(oidx)
-    V = np.full((T, N), -np.inf, dtype=np.float32)
-    B = B.astype(np.float32)
-    A_trans = A_trans.astype(np.float32)
-    A_start = A_start.astype(np.float32)
-
-    for j in range(N):
-        V[0, j] = A_start[j] + B[j, oidx[0]]
-
-    backp = np.zeros((T, N), dtype=np.int32)
-    for t in range(1, T):
-        ot = oidx[t]
-        emis_col = B[:, ot]
-        prev = V[t - 1, :]
-        cand = (prev[:, None] + A_trans)
-        best_prev_indices = np.argmax(cand, axis=0)
-        best_values = cand[best_prev_indices, np.arange(N)]
-        V[t, :] = best_values + emis_col
-        backp[t, :] = best_prev_indices
-
-    best_last = int(np.argmax(V[-1, :]))
-    best_logprob = float(V[-1, best_last])
-    path = [0] * T
-    cur = best_last
-    for t in range(T - 1, -1, -1):
-        path[t] = cur + 1
-        if t > 0:
-            cur = int(backp[t, cur])
-    return path, best_logprob
-
-# ---- utilities for output formatting ----
-
-def float32_to_hex32(f: float) -> str:
-    b = struct.pack("<f", np.float32(f).item())
-    ui = struct.unpack("<I", b)[0]
-    return f"{ui:08x}"
-
-# ---- main flow ----
-
-def main():
-    fn_N = "N.dat"
-    fn_A = "A.dat"
-    fn_B = "B.dat"
-    fn_input = "input.dat"
-    fn_output = "output_p.dat"
-
-    for fn in (fn_N, fn_A, fn_B, fn_input):
-        if not os.path.exists(fn):
-            print(f"Error: required file '{fn}' not found.", file=sys.stderr)
-            return
-
-    N, M = read_N_file(fn_N)
-    if N <= 0 or M <= 0:
-        raise RuntimeError("Invalid N or M")
-
-    A_start, A_trans = read_A_file(fn_A, N)
-    B = read_B_file(fn_B, N, M)
-    sequences = read_input_file(fn_input)
-
-    outputs = []
-    for seq in sequences:
-        for v in seq:
-            if not (1 <= v <= M):
-                raise RuntimeError(f"Observation value {v} outside 1..{M}")
-
-        path, lp = run_viterbi_for_sequence(seq, N, M, A_start, A_trans, B)
-        outputs.append((path, lp))
-
-    with open(fn_output, "w", encoding="utf-8") as f:
-        for path, lp in outputs:
-            for st in path:
-                f.write(f"{st:08x}\n")
-            f.write(f"{float32_to_hex32(lp)}\n")
-            f.write("ffffffff\n")
-        f.write("00000000\n")
-
-    print(f"Wrote {fn_output} with {len(outputs)} sequences.")
-
-if __name__ == "__main__":
-    main()
+"""
+viterbi_decoder.py
+
+Usage: put N.dat, A.dat, B.dat, Input.dat in the same directory and run:
+    python viterbi_decoder.py
+
+Writes Output.dat.
+
+Options:
+    --low-memory [--checkpoint-interval K]   bounded-memory decoding for very long sequences
+    --engine {auto,numpy,numba}              decoding engine (or set VITERBI_ENGINE)
+    --dut-adder                              use the FPadder32Pipelined bit-accurate adder model
+    --normalize                              subtract each step's maximum metric (offset tracked separately)
+    --tie-break {first,dut}                  argmax tie-breaking: first maximum, or the DUT's comparator
+    --sparse [--sparse-threshold X]          add-compare-select over transitions with A_trans > X only
+    --beam K | --beam-margin X [--beam-check [F]]
+                                             approximate decoding keeping the K best states / those within X
+                                             of the best; compare a share F of the sequences with exact decoding
+    --workers W                              decode on W processes sharing the model tables (0 = all cores)
+                                             (with --normalize, very long sequences are split in time)
+    --stream [--input PATH|-] [--output PATH|-]
+                                             decode incrementally with constant memory; '-' = stdin/stdout
+
+Assumptions & formats:
+- N.dat : two integers (N and M) as text (one per line) OR two 32-bit ints in binary.
+- A.dat : (N+1)*N IEEE-754 float32 words (binary) OR whitespace/line hex/dec values.
+    Order: first N words = transitions from start q0 -> q1..qN (a0j),
+           remaining N*N words = a_ij in row-major with i=1..N, j=1..N.
+- B.dat : N*M IEEE-754 float32 words in order b1(o1)..b1(oM), b2(o1)..bN(oM).
+- Input.dat: sequence of 32-bit integers (binary or text). Sequences separated by 0xFFFFFFFF.
+    File ends with 0xFFFFFFFF followed by 0x0.
+- Output.dat: for each input sequence, write the most probable state (one per line),
+    then the log-probability as IEEE-754 float32 hex (8 lowercase hex digits), then ffffffff.
+    Final file ends with a line containing 0.
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import hashlib
+import heapq
+import struct
+import os
+import sys
+import time
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+try:  # Optional JIT backend; the NumPy engines are used when it is missing.
+    import numba
+except ImportError:
+    numba = None
+
+# ---- helpers for flexible reading ----
+
+# Bytes that may appear in a text-format .dat file (hex/decimal tokens, 0x prefixes,
+# signed/decimal floats including inf/nan). Anything else means the file is binary.
+_TEXT_BYTES = b"0123456789abcdefABCDEFxX+-.iInNtTyY \t\r\n\v\f"
+_SNIFF_BYTES = 65536
+
+def _build_hex_lut() -> np.ndarray:
+    """Byte -> nibble value; -2 marks whitespace, -1 anything that is not a hex digit."""
+    lut = np.full(256, -1, dtype=np.int16)
+    for i, c in enumerate(b"0123456789abcdef"):
+        lut[c] = i
+    for i, c in enumerate(b"ABCDEF"):
+        lut[c] = 10 + i
+    for c in b" \t\r\n\v\f":
+        lut[c] = -2
+    return lut
+
+_HEX_LUT = _build_hex_lut()
+
+def sniff_bytes(head: bytes) -> str:
+    """Classify a leading chunk of a .dat file as 'text' or 'binary'."""
+    return "text" if not head.translate(None, _TEXT_BYTES) else "binary"
+
+def sniff_format(path: str) -> str:
+    """Classify a .dat file as 'text' or 'binary' by looking at its first 64 KiB once."""
+    with open(path, "rb") as f:
+        return sniff_bytes(f.read(_SNIFF_BYTES))
+
+def parse_hex_words(data) -> Optional[np.ndarray]:
+    """Vectorized parse of whitespace-separated hex tokens (optional 0x prefix) into uint32.
+
+    `data` is the raw file contents as bytes or a uint8 array. Returns None if any
+    token is not plain hex or is wider than 8 digits, so callers can fall back
+    to the per-token parser (e.g. for decimal floats).
+    """
+    buf = np.frombuffer(data, dtype=np.uint8) if isinstance(data, (bytes, bytearray)) else data
+    vals = _HEX_LUT[buf]
+    ws = vals == -2
+
+    # Blank out "0x"/"0X" prefixes; an 'x' anywhere else is not a hex token.
+    xpos = np.flatnonzero((buf == ord("x")) | (buf == ord("X")))
+    if xpos.size:
+        if xpos[0] == 0:
+            return None
+        prefix_ok = buf[xpos - 1] == ord("0")
+        prefix_ok &= np.where(xpos >= 2, ws[np.maximum(xpos - 2, 0)], True)
+        if not prefix_ok.all():
+            return None
+        vals[xpos] = -2
+        vals[xpos - 1] = -2
+        ws = vals == -2
+
+    if (vals == -1).any():
+        return None
+    keep = np.flatnonzero(~ws)
+    if keep.size == 0:
+        return np.zeros(0, dtype=np.uint32)
+
+    starts = np.flatnonzero(np.concatenate(([True], np.diff(keep) != 1)))
+    ends = np.append(starts[1:], keep.size)
+    widths = ends - starts
+    if widths.max() > 8:
+        return None
+    tok_id = np.repeat(np.arange(starts.size), widths)
+    shift = (4 * (ends[tok_id] - 1 - np.arange(keep.size))).astype(np.uint64)
+    digits = vals[keep].astype(np.uint64) << shift
+    return np.bitwise_or.reduceat(digits, starts).astype(np.uint32)
+
+def parse_token_as_int(tok: str) -> int:
+    tok = tok.strip()
+    if tok.lower().startswith("0x"):
+        return int(tok, 16)
+    try:
+        return int(tok, 16)
+    except Exception:
+        return int(tok, 10)
+
+def parse_token_as_float_from_hex_or_dec(tok: str) -> float:
+    tok = tok.strip()
+    if tok.lower().startswith("0x"):
+        ui = int(tok, 16)
+        return struct.unpack("<f", struct.pack("<I", ui))[0]
+    try:
+        ui = int(tok, 16)
+        return struct.unpack("<f", struct.pack("<I", ui))[0]
+    except Exception:
+        return float(tok)
+
+def load_words(path: str, fmt: Optional[str] = None) -> np.ndarray:
+    """Load a .dat file as uint32 words.
+
+    Binary files are memory-mapped (little-endian), so multi-gigabyte input.dat
+    files are not copied into RAM. Text files are read once and parsed with
+    parse_hex_words, falling back to per-token parsing for decimal tokens.
+    """
+    fmt = fmt or sniff_format(path)
+    if fmt == "binary":
+        size = os.path.getsize(path)
+        if size % 4 != 0:
+            raise ValueError(f"{path}: binary length is not multiple of 4")
+        if size == 0:
+            return np.zeros(0, dtype=np.uint32)
+        return np.memmap(path, dtype="<u4", mode="r")
+    data = np.fromfile(path, dtype=np.uint8)
+    words = parse_hex_words(data)
+    if words is None:
+        toks = data.tobytes().decode("ascii").split()
+        words = np.array([parse_token_as_int(t) for t in toks], dtype=np.uint32)
+    return words
+
+def load_float32(path: str, fmt: Optional[str] = None) -> np.ndarray:
+    """Load a .dat file of IEEE-754 float32 values (binary, hex bit patterns or decimal text)."""
+    fmt = fmt or sniff_format(path)
+    if fmt == "binary":
+        if os.path.getsize(path) % 4 != 0:
+            raise ValueError(f"{path}: binary length is not multiple of 4")
+        return np.fromfile(path, dtype="<f4").astype(np.float32)
+    data = np.fromfile(path, dtype=np.uint8)
+    words = parse_hex_words(data)
+    if words is not None:
+        return words.view(np.float32)
+    toks = data.tobytes().decode("ascii").split()
+    return np.array([parse_token_as_float_from_hex_or_dec(t) for t in toks], dtype=np.float32)
+
+def split_sequences(words: np.ndarray) -> List[np.ndarray]:
+    """Split an input.dat word stream into sequences on 0xFFFFFFFF markers.
+
+    The stream ends at the first 0xFFFFFFFF followed by 0x0; empty sequences
+    (consecutive markers) are dropped, and trailing words without a final
+    marker still form a sequence. Returned arrays are uint32 views of the stream
+    (of the memory map for binary files, nothing is copied); the decoders
+    convert each sequence when they decode it.
+    """
+    marks = np.flatnonzero(words == 0xFFFFFFFF)
+    end = words.size
+    if marks.size:
+        nxt = marks + 1
+        nxt_in = nxt < words.size
+        stop = marks[nxt_in][words[nxt[nxt_in]] == 0]
+        if stop.size:
+            end = int(stop[0])
+            marks = marks[marks < end]
+    words = np.asarray(words[:end])  # plain ndarray view, also of a memmap
+    bounds = np.concatenate(([-1], marks, [end]))
+    return [words[a + 1:b] for a, b in zip(bounds[:-1], bounds[1:]) if b - a > 1]
+
+# ---- reading specific files ----
+
+def read_N_file(path: str) -> Tuple[int, int]:
+    try:
+        words = load_words(path)
+    except Exception as e:
+        raise RuntimeError(f"Unable to parse {path}: {e}")
+    if len(words) < 2:
+        raise RuntimeError(f"Could not parse N/M from {path}")
+    return int(words[0]), int(words[1])
+
+def read_A_file(path: str, N: int) -> Tuple[np.ndarray, np.ndarray]:
+    fmt = sniff_format(path)
+    try:
+        arr = load_float32(path, fmt)
+    except Exception as e:
+        raise RuntimeError(f"Unable to parse {path}: {e}")
+    expected = (N + 1) * N
+    if len(arr) < expected or (fmt == "binary" and len(arr) != expected):
+        raise RuntimeError(f"A.dat doesn't have expected {expected} entries (found {len(arr)})")
+    arr = arr[:expected]
+    A_start = arr[:N].astype(np.float32)
+    A_trans = arr[N:].reshape((N, N)).astype(np.float32)
+    return A_start, A_trans
+
+def read_B_file(path: str, N: int, M: int) -> np.ndarray:
+    fmt = sniff_format(path)
+    try:
+        arr = load_float32(path, fmt)
+    except Exception as e:
+        raise RuntimeError(f"Unable to parse {path}: {e}")
+    if len(arr) < N * M or (fmt == "binary" and len(arr) != N * M):
+        raise RuntimeError(f"B.dat doesn't have expected {N * M} entries (found {len(arr)})")
+    return arr[: N * M].astype(np.float32).reshape((N, M))
+
+def read_input_file(path: str) -> List[np.ndarray]:
+    """Read input.dat (text or binary) into a list of uint32 observation arrays (see split_sequences)."""
+    try:
+        return split_sequences(load_words(path))
+    except Exception as e:
+        raise RuntimeError(f"Failed to parse {path}: {e}")
+
+# ---- Viterbi algorithm ----
+
+TIE_BREAKS = ("first", "dut")
+
+def _argbest(x: np.ndarray, axis: int, tie_break: str = "first") -> np.ndarray:
+    """Index of the best metric along `axis`.
+
+    "first" is np.argmax: the lowest index among equal float32 values.
+    "dut" is the comparator of the compare stage in dut.bsv, a strict unsigned
+    '<' on the float32 bit patterns starting from 0xFFFFFFFF: the smallest
+    pattern wins, lowest index first. For negative metrics both agree; they
+    differ for +0.0 vs -0.0 (the DUT takes +0.0) and between positive metrics
+    (the DUT takes the smaller).
+    """
+    if tie_break == "first":
+        return np.argmax(x, axis=axis)
+    if tie_break == "dut":
+        return np.argmin(np.asarray(x, dtype=np.float32).view(np.uint32), axis=axis)
+    raise ValueError(f"Unknown tie_break '{tie_break}' (expected one of {', '.join(TIE_BREAKS)})")
+
+def _normalize_rows(V: np.ndarray) -> np.ndarray:
+    """Subtract each row's maximum (last axis) in place; returns the maxima subtracted.
+
+    Rows without a finite maximum are left as they are (their entry is 0).
+    The maximum itself becomes +0.0, so the DUT comparator order is kept.
+    """
+    m = V.max(axis=-1)
+    m = np.where(np.isfinite(m), m, np.float32(0))
+    V -= m[..., None]
+    return m
+
+SPARSE_THRESHOLD = -1e8  # generate_test_data.py writes impossible transitions as -1e9
+
+class SparseTrellis(NamedTuple):
+    """Surviving transitions of A_trans in CSR form, grouped by destination state.
+
+    Predecessors of destination j are indices[indptr[j]:indptr[j + 1]]
+    (ascending), with log-probabilities values[...]. pruned_max[j] is the
+    largest pruned A_trans[:, j] (-inf if none was pruned).
+    """
+    threshold: float
+    indptr: np.ndarray
+    indices: np.ndarray
+    values: np.ndarray
+    pruned_max: np.ndarray
+
+def build_sparse_trellis(A_trans: np.ndarray, threshold: float = SPARSE_THRESHOLD) -> SparseTrellis:
+    """Keep the transitions above `threshold`; a destination with none keeps its largest ones."""
+    A = np.ascontiguousarray(A_trans, dtype=np.float32)
+    keep = A > threshold
+    keep |= ~keep.any(axis=0)[None, :] & (A == A.max(axis=0)[None, :])
+    dest, pred = np.nonzero(keep.T)  # sorted by destination, then predecessor
+    indptr = np.zeros(A.shape[1] + 1, dtype=np.intp)
+    np.cumsum(np.bincount(dest, minlength=A.shape[1]), out=indptr[1:])
+    pruned_max = np.where(keep, np.float32(-np.inf), A).max(axis=0)
+    return SparseTrellis(float(threshold), indptr, pred.astype(np.intp), A[pred, dest], pruned_max)
+
+def _sparse_select(prev: np.ndarray, A_trans: np.ndarray, trellis: SparseTrellis,
+                   tie_break: str = "first") -> Tuple[np.ndarray, np.ndarray]:
+    """ACS step over the surviving edges: (best predecessor, best value) per destination.
+
+    prev is a metric row (N,) or a stack of them (k, N). The result equals the
+    dense step exactly: wherever a pruned edge could have won or tied (its
+    candidate is bounded by max(prev) + pruned_max in float32), that row is
+    recomputed densely.
+    """
+    shape = prev.shape
+    prev = prev.reshape(-1, shape[-1])
+    cand = prev[:, trellis.indices] + trellis.values
+    starts = trellis.indptr[:-1]
+    counts = np.diff(trellis.indptr)
+    if tie_break == "first":
+        best = np.maximum.reduceat(cand, starts, axis=1)
+        hit = cand == np.repeat(best, counts, axis=1)
+    elif tie_break == "dut":
+        bits = cand.view(np.uint32)
+        hit = bits == np.repeat(np.minimum.reduceat(bits, starts, axis=1), counts, axis=1)
+    else:
+        raise ValueError(f"Unknown tie_break '{tie_break}' (expected one of {', '.join(TIE_BREAKS)})")
+    nnz = cand.shape[1]
+    first = np.minimum.reduceat(np.where(hit, np.arange(nnz), nnz), starts, axis=1)
+    first = np.minimum(first, nnz - 1)  # no hit only with NaN; the check below falls back then
+    best_prev_indices = trellis.indices[first]
+    best_values = np.take_along_axis(cand, first, axis=1)
+
+    bound = prev.max(axis=1, keepdims=True) + trellis.pruned_max
+    exact = (best_values > bound) | np.isneginf(trellis.pruned_max)
+    if tie_break == "dut":
+        exact &= (bound < 0) | np.isneginf(trellis.pruned_max)  # bit-pattern order = float order
+    rows = ~exact.all(axis=1)
+    if rows.any():
+        dense = prev[rows][:, :, None] + A_trans[None, :, :]
+        best_prev_indices[rows] = _argbest(dense, 1, tie_break)
+        best_values[rows] = np.take_along_axis(dense, best_prev_indices[rows][:, None, :], axis=1)[:, 0, :]
+    return best_prev_indices.reshape(shape), best_values.reshape(shape)
+
+def run_viterbi_for_sequence(obs: List[int], N: int, M: int,
+                             A_start: np.ndarray, A_trans: np.ndarray, B: np.ndarray,
+                             adder: Optional[Callable] = None, normalize: bool = False,
+                             tie_break: str = "first",
+                             trellis: Optional[SparseTrellis] = None) -> Tuple[List[int], float]:
+    """Reference decoder. `adder` replaces float32 addition, e.g. fpadder_model.fp_add to
+    reproduce the DUT's FPadder32Pipelined bit for bit; operands are passed in the DUT's
+    order (memory value, path metric).
+
+    With normalize=True every metric row is shifted so that its maximum is 0,
+    as a fixed-width hardware metric would be; the subtracted maxima are summed
+    in float64 and added back to the reported log-probability. The metrics then
+    stay small over long sequences, so the result can differ from the raw
+    float32 recursion where rounding decided a near-tie. tie_break selects the
+    comparator ("first" or "dut", see _argbest). With a `trellis`
+    (build_sparse_trellis) each step only evaluates the surviving transitions;
+    the output is unchanged."""
+    if adder is not None and trellis is not None:
+        raise ValueError("adder and trellis cannot be combined")
+    if len(obs) == 0:
+        return [], float("-inf")
+    oidx = [o - 1 for o in obs]
+    T = len(oidx)
+    V = np.full((T, N), -np.inf, dtype=np.float32)
+    B = B.astype(np.float32)
+    A_trans = A_trans.astype(np.float32)
+    A_start = A_start.astype(np.float32)
+    offset = 0.0
+
+    if adder is None:
+        for j in range(N):
+            V[0, j] = A_start[j] + B[j, oidx[0]]
+    else:
+        V[0, :] = adder(B[:, oidx[0]], A_start)
+    if normalize:
+        offset += float(_normalize_rows(V[0]))
+
+    backp = np.zeros((T, N), dtype=np.int32)
+    for t in range(1, T):
+        ot = oidx[t]
+        emis_col = B[:, ot]
+        prev = V[t - 1, :]
+        if trellis is not None:
+            best_prev_indices, best_values = _sparse_select(prev, A_trans, trellis, tie_break)
+        else:
+            cand = (prev[:, None] + A_trans) if adder is None else adder(A_trans, prev[:, None])
+            best_prev_indices = _argbest(cand, 0, tie_break)
+            best_values = cand[best_prev_indices, np.arange(N)]
+        V[t, :] = (best_values + emis_col) if adder is None else adder(emis_col, best_values)
+        backp[t, :] = best_prev_indices
+        if normalize:
+            offset += float(_normalize_rows(V[t]))
+
+    best_last = int(_argbest(V[-1, :], 0, tie_break))
+    best_logprob = float(V[-1, best_last])
+    if normalize:
+        best_logprob = float(np.float32(offset + best_logprob))
+    path = [0] * T
+    cur = best_last
+    for t in range(T - 1, -1, -1):
+        path[t] = cur + 1
+        if t > 0:
+            cur = int(backp[t, cur])
+    return path, best_logprob
+
+def run_viterbi_batch(seqs: List[List[int]], N: int, M: int,
+                      A_start: np.ndarray, A_trans: np.ndarray, B: np.ndarray,
+                      max_batch: int = 4096,
+                      emis_T: Optional[np.ndarray] = None, normalize: bool = False,
+                      tie_break: str = "first",
+                      trellis: Optional[SparseTrellis] = None) -> List[Tuple[List[int], float]]:
+    """Decode many sequences at once; results match run_viterbi_for_sequence bit for bit.
+
+    Sequences are sorted by length (longest first) and cut into buckets of at
+    most max_batch, so at every time step the still-active sequences form a
+    prefix of the bucket and the ACS step is a single (k, N, N) NumPy operation.
+    Finished sequences are simply left out of the slice, so their last metric
+    row is never touched again. emis_T, the (M, N) contiguous transpose of B,
+    may be passed in precomputed (see prepare_model). normalize, tie_break and
+    trellis are as in run_viterbi_for_sequence.
+    """
+    A_trans = np.asarray(A_trans, dtype=np.float32)
+    A_start = np.asarray(A_start, dtype=np.float32)
+    if emis_T is None:
+        emis_T = np.ascontiguousarray(np.asarray(B, dtype=np.float32).T)
+
+    results: List[Tuple[List[int], float]] = [([], float("-inf"))] * len(seqs)
+    order = sorted((i for i in range(len(seqs)) if len(seqs[i]) > 0),
+                   key=lambda i: len(seqs[i]), reverse=True)
+    for start in range(0, len(order), max_batch):
+        bucket = order[start:start + max_batch]
+        lengths = np.array([len(seqs[i]) for i in bucket], dtype=np.int64)
+        Bsz, T = len(bucket), int(lengths[0])
+
+        # Padded observation matrix (0-based); padding is never read.
+        oidx = np.zeros((Bsz, T), dtype=np.int64)
+        for b, i in enumerate(bucket):
+            oidx[b, :lengths[b]] = np.asarray(seqs[i], dtype=np.int64) - 1
+        # active[t] = number of sequences with length > t (a prefix, as lengths are sorted)
+        active = Bsz - np.searchsorted(lengths[::-1], np.arange(T), side="right")
+
+        V = A_start[None, :] + emis_T[oidx[:, 0]]
+        offset = _normalize_rows(V).astype(np.float64) if normalize else None
+        backp = np.zeros((T, Bsz, N), dtype=np.int32)
+        for t in range(1, T):
+            k = int(active[t])
+            prev = V[:k]
+            if trellis is not None:
+                best_prev_indices, best_values = _sparse_select(prev, A_trans, trellis, tie_break)
+            else:
+                cand = prev[:, :, None] + A_trans[None, :, :]
+                best_prev_indices = _argbest(cand, 1, tie_break)
+                best_values = np.take_along_axis(cand, best_prev_indices[:, None, :], axis=1)[:, 0, :]
+            V[:k] = best_values + emis_T[oidx[:k, t]]
+            backp[t, :k] = best_prev_indices
+            if normalize:
+                offset[:k] += _normalize_rows(V[:k])
+
+        best_last = _argbest(V, 1, tie_break)
+        best_logprob = V[np.arange(Bsz), best_last]
+        if normalize:
+            best_logprob = (offset + best_logprob).astype(np.float32)
+
+        paths = np.zeros((Bsz, T), dtype=np.int32)
+        cur = best_last.astype(np.int64)
+        rows = np.arange(Bsz)
+        for t in range(T - 1, -1, -1):
+            k = int(active[t])
+            paths[:k, t] = cur[:k] + 1
+            if t > 0:
+                cur[:k] = backp[t, rows[:k], cur[:k]]
+
+        for b, i in enumerate(bucket):
+            results[i] = (paths[b, :lengths[b]].tolist(), float(best_logprob[b]))
+    return results
+
+# ---- low-memory decoding for very long sequences ----
+
+def _backpointer_dtype(N: int) -> np.dtype:
+    """Smallest unsigned type that can hold a 0-based state index (uint8 for N <= 256)."""
+    return np.dtype(np.uint8) if N <= 256 else np.dtype(np.uint16)
+
+def _forward_segment(V_row: np.ndarray, oidx: np.ndarray, t0: int, t1: int,
+                     A_trans: np.ndarray, B: np.ndarray,
+                     backp: Optional[np.ndarray] = None, normalize: bool = False,
+                     tie_break: str = "first",
+                     maxima: Optional[np.ndarray] = None) -> Tuple[np.ndarray, float]:
+    """Advance metric row V[t0] to V[t1], optionally filling backp[t - t0 - 1] for t0 < t <= t1.
+
+    Uses the same float32 operations as run_viterbi_for_sequence, so rows computed
+    here (and recomputed later from a checkpoint) are bit-identical to the full V.
+    Returns the row and the sum of the maxima subtracted on the way (0.0 without
+    normalize); with normalize, maxima[t - t0 - 1] may receive each of them.
+    """
+    N = V_row.shape[0]
+    cols = np.arange(N)
+    cand = np.empty((N, N), dtype=np.float32)
+    prev = V_row
+    offset = 0.0
+    for t in range(t0 + 1, t1 + 1):
+        np.add(prev[:, None], A_trans, out=cand)
+        best_prev_indices = _argbest(cand, 0, tie_break)
+        prev = cand[best_prev_indices, cols] + B[:, oidx[t]]
+        if normalize:
+            m = _normalize_rows(prev)
+            offset += float(m)
+            if maxima is not None:
+                maxima[t - t0 - 1] = m
+        if backp is not None:
+            backp[t - t0 - 1] = best_prev_indices
+    return prev, offset
+
+def run_viterbi_lowmem(obs, N: int, M: int,
+                       A_start: np.ndarray, A_trans: np.ndarray, B: np.ndarray,
+                       checkpoint_interval: Optional[int] = None, normalize: bool = False,
+                       tie_break: str = "first") -> Tuple[np.ndarray, float]:
+    """Low-memory variant of run_viterbi_for_sequence for multi-million-symbol streams.
+
+    Only a rolling metric row is kept and backpointers are stored as uint8.
+    With checkpoint_interval=K the full backpointer table is never built:
+    the forward pass saves one metric row every K steps, and the traceback
+    recomputes backpointers one K-step segment at a time, newest first. Peak
+    memory is then O((T/K + K) * N) on top of the path, at roughly twice the
+    compute; K close to sqrt(T) minimizes it.
+
+    Returns the 1-based state path as a NumPy array (uint8 for N <= 255)
+    instead of a list, plus the float32 log-probability as a Python float.
+    Results are bit-identical to run_viterbi_for_sequence with the same
+    normalize and tie_break; normalized checkpoints are recomputed exactly, the
+    offset is only accumulated by the forward pass.
+    """
+    T = len(obs)
+    if T == 0:
+        return np.zeros(0, dtype=np.uint8), float("-inf")
+    oidx = np.asarray(obs, dtype=np.int64) - 1
+    B = B.astype(np.float32)
+    A_trans = A_trans.astype(np.float32)
+    A_start = A_start.astype(np.float32)
+    bp_dtype = _backpointer_dtype(N)
+    path = np.zeros(T, dtype=_backpointer_dtype(N + 1))
+
+    V0 = A_start + B[:, oidx[0]]
+    offset = float(_normalize_rows(V0)) if normalize else 0.0
+    step = dict(normalize=normalize, tie_break=tie_break)
+    K = checkpoint_interval if checkpoint_interval is not None else max(T - 1, 1)
+    if K < 1:
+        raise ValueError("checkpoint_interval must be positive")
+    n_seg = (T - 1 + K - 1) // K
+
+    if checkpoint_interval is None:
+        # Single segment: full uint8 backpointer table, no recomputation.
+        backp = np.zeros((max(T - 1, 0), N), dtype=bp_dtype)
+        V_last, seg_offset = _forward_segment(V0, oidx, 0, T - 1, A_trans, B, backp, **step)
+        offset += seg_offset
+        checkpoints = None
+    else:
+        checkpoints = np.empty((max(n_seg, 1), N), dtype=np.float32)
+        checkpoints[0] = V0
+        V_last = V0
+        for c in range(n_seg):
+            t0, t1 = c * K, min((c + 1) * K, T - 1)
+            V_last, seg_offset = _forward_segment(V_last, oidx, t0, t1, A_trans, B, **step)
+            offset += seg_offset
+            if c + 1 < n_seg:
+                checkpoints[c + 1] = V_last
+        backp = np.zeros((K, N), dtype=bp_dtype)
+
+    best_last = int(_argbest(V_last, 0, tie_break))
+    best_logprob = float(V_last[best_last])
+    if normalize:
+        best_logprob = float(np.float32(offset + best_logprob))
+
+    cur = best_last
+    for c in range(n_seg - 1, -1, -1):
+        t0, t1 = c * K, min((c + 1) * K, T - 1)
+        if checkpoints is not None:
+            _forward_segment(checkpoints[c], oidx, t0, t1, A_trans, B, backp, **step)
+        for t in range(t1, t0, -1):
+            path[t] = cur + 1
+            cur = int(backp[t - t0 - 1, cur])
+    path[0] = cur + 1
+    return path, best_logprob
+
+# ---- beam-pruned decoding ----
+
+def _beam_states(row: np.ndarray, beam_width: Optional[int], margin: Optional[float]) -> np.ndarray:
+    """Ascending indices of the states kept after a step: within `margin` of the best
+    metric, and at most the beam_width best of those (lowest index first among equals)."""
+    kept = np.arange(row.shape[0])
+    if margin is not None:
+        kept = kept[row >= row.max() - np.float32(margin)]
+    if beam_width is not None and len(kept) > beam_width:
+        kept = np.sort(kept[np.argsort(-row[kept], kind="stable")[:beam_width]])
+    return kept
+
+def run_viterbi_beam(obs, N: int, M: int,
+                     A_start: np.ndarray, A_trans: np.ndarray, B: np.ndarray,
+                     beam_width: Optional[int] = None, margin: Optional[float] = None,
+                     normalize: bool = False, tie_break: str = "first") -> Tuple[List[int], float]:
+    """Approximate decoder for large state spaces: only the states kept by the beam
+    (_beam_states) are extended at the next step.
+
+    A step then costs O(k * N) for k kept states instead of O(N^2). The result
+    can differ from run_viterbi_for_sequence where the best path left the beam
+    (BeamAudit measures how often); with every state kept it is identical, the
+    metric arithmetic, normalize and tie_break being the same.
+    """
+    if beam_width is None and margin is None:
+        raise ValueError("beam decoding needs beam_width or margin")
+    if beam_width is not None and beam_width < 1:
+        raise ValueError("beam_width must be positive")
+    if margin is not None and not margin >= 0:
+        raise ValueError("margin must be non-negative")
+    if len(obs) == 0:
+        return [], float("-inf")
+    oidx = np.asarray(obs, dtype=np.int64) - 1
+    T = len(oidx)
+    B = np.asarray(B, dtype=np.float32)
+    A_trans = np.asarray(A_trans, dtype=np.float32)
+    cols = np.arange(N)
+
+    row = np.asarray(A_start, dtype=np.float32) + B[:, oidx[0]]
+    offset = float(_normalize_rows(row)) if normalize else 0.0
+    backp = np.zeros((T, N), dtype=_backpointer_dtype(N))
+    for t in range(1, T):
+        kept = _beam_states(row, beam_width, margin)
+        cand = row[kept][:, None] + A_trans[kept]
+        best = _argbest(cand, 0, tie_break)
+        row = cand[best, cols] + B[:, oidx[t]]
+        backp[t] = kept[best]
+        if normalize:
+            offset += float(_normalize_rows(row))
+
+    best_last = int(_argbest(row, 0, tie_break))
+    best_logprob = float(row[best_last])
+    if normalize:
+        best_logprob = float(np.float32(offset + best_logprob))
+    path = [0] * T
+    cur = best_last
+    for t in range(T - 1, -1, -1):
+        path[t] = cur + 1
+        if t > 0:
+            cur = int(backp[t, cur])
+    return path, best_logprob
+
+class BeamAudit:
+    """Decodes with `beam` and checks a random share `fraction` of the sequences against `exact`.
+
+    Both are functions from a list of sequences to (path, log-probability)
+    pairs; the beam results are returned. summary() reports how many checked
+    sequences differ (path or log-probability), the share of differing
+    states, the largest log-probability lost, and the throughput of both.
+    """
+
+    def __init__(self, beam: Callable, exact: Callable, fraction: float = 1.0, seed: int = 0):
+        self.beam = beam
+        self.exact = exact
+        self.fraction = fraction
+        self._rng = np.random.default_rng(seed)
+        self.checked = self.differing = 0
+        self.states = self.states_differing = 0
+        self.max_loss = 0.0
+        self.beam_symbols = self.exact_symbols = 0
+        self.beam_seconds = self.exact_seconds = 0.0
+
+    def __call__(self, sequences) -> List[Tuple[List[int], float]]:
+        sequences = list(sequences)
+        start = time.perf_counter()
+        results = self.beam(sequences)
+        self.beam_seconds += time.perf_counter() - start
+        self.beam_symbols += sum(len(s) for s in sequences)
+
+        sample = np.flatnonzero(self._rng.random(len(sequences)) < self.fraction)
+        start = time.perf_counter()
+        exact = self.exact([sequences[i] for i in sample])
+        self.exact_seconds += time.perf_counter() - start
+        for i, (path, logprob) in zip(sample, exact):
+            beam_path, beam_logprob = results[i]
+            diff = int(np.count_nonzero(np.asarray(path) != np.asarray(beam_path)))
+            self.checked += 1
+            self.states += len(path)
+            self.states_differing += diff
+            if diff or logprob != beam_logprob:
+                self.differing += 1
+                if np.isfinite(logprob):
+                    self.max_loss = max(self.max_loss, logprob - beam_logprob)
+            self.exact_symbols += len(path)
+        return results
+
+    def summary(self) -> str:
+        if not self.checked:
+            return "Beam check: no sequence compared with exact decoding."
+        beam_rate = self.beam_symbols / max(self.beam_seconds, 1e-9)
+        exact_rate = self.exact_symbols / max(self.exact_seconds, 1e-9)
+        return (f"Beam check: {self.differing}/{self.checked} sequences differ from exact decoding "
+                f"({100 * self.differing / self.checked:.2f}%), "
+                f"{100 * self.states_differing / max(self.states, 1):.3f}% of states, "
+                f"largest log-probability loss {self.max_loss:.6g}\n"
+                f"Throughput: beam {beam_rate:,.0f} symbols/s, exact {exact_rate:,.0f} symbols/s "
+                f"({beam_rate / max(exact_rate, 1e-9):.2f}x)")
+
+# ---- compiled (JIT) engine ----
+
+def _viterbi_kernel(oidx, A_start, A_trans, B, path):
+    """Forward pass + traceback as plain loops over preallocated buffers.
+
+    Meant to be compiled with numba: all metric arithmetic stays float32 and
+    the strict '>' keeps the first maximum, i.e. the same tie-breaking as
+    np.argmax in run_viterbi_for_sequence. Writes 0-based states into `path`
+    and returns the final log-probability.
+    """
+    T = oidx.shape[0]
+    N = A_start.shape[0]
+    prev = np.empty(N, dtype=np.float32)
+    cur = np.empty(N, dtype=np.float32)
+    backp = np.empty((T, N), dtype=np.int32)
+    for j in range(N):
+        prev[j] = A_start[j] + B[j, oidx[0]]
+    for t in range(1, T):
+        o = oidx[t]
+        for j in range(N):
+            best_i = 0
+            best_v = prev[0] + A_trans[0, j]
+            for i in range(1, N):
+                v = prev[i] + A_trans[i, j]
+                if v > best_v:
+                    best_v = v
+                    best_i = i
+            cur[j] = best_v + B[j, o]
+            backp[t, j] = best_i
+        for j in range(N):
+            prev[j] = cur[j]
+    best_last = 0
+    for j in range(1, N):
+        if prev[j] > prev[best_last]:
+            best_last = j
+    s = best_last
+    for t in range(T - 1, -1, -1):
+        path[t] = s
+        if t > 0:
+            s = backp[t, s]
+    return prev[best_last]
+
+if numba is not None:
+    _viterbi_kernel_jit = numba.njit(cache=True, nogil=True)(_viterbi_kernel)
+else:
+    _viterbi_kernel_jit = None
+
+ENGINES = ("auto", "numpy", "numba")
+ENGINE_ENV_VAR = "VITERBI_ENGINE"
+
+def select_engine(name: Optional[str] = None) -> str:
+    """Resolve an engine name (argument, else $VITERBI_ENGINE, else 'auto') to 'numpy' or 'numba'."""
+    name = (name or os.environ.get(ENGINE_ENV_VAR) or "auto").lower()
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine '{name}' (expected one of {', '.join(ENGINES)})")
+    if name == "auto":
+        return "numba" if _viterbi_kernel_jit is not None else "numpy"
+    if name == "numba" and _viterbi_kernel_jit is None:
+        raise RuntimeError("Engine 'numba' requested but numba is not installed")
+    return name
+
+def run_viterbi_compiled(obs, N: int, M: int,
+                         A_start: np.ndarray, A_trans: np.ndarray, B: np.ndarray) -> Tuple[List[int], float]:
+    """run_viterbi_for_sequence on the JIT kernel; bit-identical results."""
+    if len(obs) == 0:
+        return [], float("-inf")
+    oidx = np.asarray(obs, dtype=np.int64) - 1
+    path = np.empty(len(oidx), dtype=np.int32)
+    lp = _viterbi_kernel_jit(oidx,
+                             np.ascontiguousarray(A_start, dtype=np.float32),
+                             np.ascontiguousarray(A_trans, dtype=np.float32),
+                             np.ascontiguousarray(B, dtype=np.float32),
+                             path)
+    return (path + 1).tolist(), float(lp)
+
+# ---- in-process API ----
+
+class ViterbiModel(NamedTuple):
+    """Model parameters prepared once for decoding: float32, contiguous, with B transposed."""
+    key: str
+    N: int
+    M: int
+    A_start: np.ndarray
+    A_trans: np.ndarray
+    B: np.ndarray
+    emis_T: np.ndarray
+
+MODEL_CACHE_SIZE = 16
+_model_cache: "OrderedDict[str, ViterbiModel]" = OrderedDict()
+
+def model_key(N: int, M: int, A_start: np.ndarray, A_trans: np.ndarray, B: np.ndarray) -> str:
+    """Content hash of a model (shape plus float32 bit patterns of A_start, A_trans, B)."""
+    h = hashlib.sha1(f"{N},{M}".encode())
+    for arr in (A_start, A_trans, B):
+        h.update(np.ascontiguousarray(arr, dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+def prepare_model(N: int, M: int, A_start: np.ndarray, A_trans: np.ndarray, B: np.ndarray) -> ViterbiModel:
+    """Return the prepared model for these parameters, reusing an LRU-cached copy if present."""
+    key = model_key(N, M, A_start, A_trans, B)
+    model = _model_cache.get(key)
+    if model is not None:
+        _model_cache.move_to_end(key)
+        return model
+    A_start = np.ascontiguousarray(A_start, dtype=np.float32).reshape(N)
+    A_trans = np.ascontiguousarray(A_trans, dtype=np.float32).reshape((N, N))
+    B = np.ascontiguousarray(B, dtype=np.float32).reshape((N, M))
+    model = ViterbiModel(key, N, M, A_start, A_trans, B, np.ascontiguousarray(B.T))
+    _model_cache[key] = model
+    if len(_model_cache) > MODEL_CACHE_SIZE:
+        _model_cache.popitem(last=False)
+    return model
+
+def check_observations(sequences, M: int) -> None:
+    for seq in sequences:
+        seq = np.asarray(seq)
+        bad = seq[(seq < 1) | (seq > M)]
+        if bad.size:
+            raise RuntimeError(f"Observation value {int(bad[0])} outside 1..{M}")
+
+def decode(N: int, M: int, A_start: np.ndarray, A_trans: np.ndarray, B: np.ndarray,
+           sequences, engine: Optional[str] = None, normalize: bool = False,
+           tie_break: str = "first",
+           trellis: Optional[SparseTrellis] = None) -> List[Tuple[List[int], float]]:
+    """Decode `sequences` (lists/arrays of 1-based observations) without touching the filesystem.
+
+    Equivalent to running this script on the same .dat contents; returns one
+    (path, log-probability) pair per sequence, as written to output_p.dat.
+    `engine` is resolved by select_engine; the numba kernel only implements the
+    default normalize / tie_break without a sparse trellis, other settings use
+    the NumPy engine.
+    """
+    check_observations(sequences, M)
+    model = prepare_model(N, M, A_start, A_trans, B)
+    return decode_prepared(model, sequences, engine, normalize, tie_break, trellis)
+
+def decode_prepared(model: ViterbiModel, sequences, engine: Optional[str] = None,
+                    normalize: bool = False, tie_break: str = "first",
+                    trellis: Optional[SparseTrellis] = None) -> List[Tuple[List[int], float]]:
+    """decode() on an already prepared model; observations are not range-checked here."""
+    N, M = model.N, model.M
+    if select_engine(engine) == "numba" and not normalize and tie_break == "first" and trellis is None:
+        return [run_viterbi_compiled(seq, N, M, model.A_start, model.A_trans, model.B)
+                for seq in sequences]
+    return run_viterbi_batch(sequences, N, M, model.A_start, model.A_trans, model.B,
+                             emis_T=model.emis_T, normalize=normalize, tie_break=tie_break,
+                             trellis=trellis)
+
+# ---- multi-core decoding ----
+
+CHUNKS_PER_WORKER = 4  # more chunks than workers evens out the tail of a run
+SEQUENCE_COST = 16     # per-sequence overhead in symbols, for balancing chunks
+_SHARED_TABLES = ("A_start", "A_trans", "B", "emis_T")
+_worker_model: Optional[ViterbiModel] = None
+_worker_options: tuple = ()
+_worker_shm: List[shared_memory.SharedMemory] = []
+
+def balance_chunks(lengths: List[int], num_chunks: int) -> List[List[int]]:
+    """Split sequence indices into num_chunks groups of similar total cost
+    (longest first, each to the currently lightest chunk); indices stay ascending."""
+    heap = [(0, c) for c in range(num_chunks)]
+    chunks: List[List[int]] = [[] for _ in range(num_chunks)]
+    for i in sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True):
+        load, c = heapq.heappop(heap)
+        chunks[c].append(i)
+        heapq.heappush(heap, (load + lengths[i] + SEQUENCE_COST, c))
+    return [sorted(c) for c in chunks if c]
+
+def _attach_model(key: str, N: int, M: int, tables: dict, options: tuple) -> None:
+    """Pool initializer: map the parent's shared model tables (no copy) into this worker."""
+    global _worker_model, _worker_options, _worker_shm
+    arrays = {}
+    for name, (shm_name, shape) in tables.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_shm.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+    _worker_model = ViterbiModel(key, N, M, **arrays)
+    _worker_options = options
+
+def _decode_chunk(sequences) -> List[Tuple[List[int], float]]:
+    return decode_prepared(_worker_model, sequences, *_worker_options)
+
+class ParallelDecoder:
+    """Decodes independent sequences on a process pool; results are identical to decode().
+
+    The model tables (A_start, A_trans, B and its transpose) are copied once
+    into shared memory and mapped by every worker at start-up, so tasks only
+    carry sequences. Each call splits its sequences into length-balanced
+    chunks and puts the results back in input order. Use as a context
+    manager, or call close(), to release the pool and the shared memory.
+    """
+
+    def __init__(self, model: ViterbiModel, workers: int = 0, engine: Optional[str] = None,
+                 normalize: bool = False, tie_break: str = "first",
+                 trellis: Optional[SparseTrellis] = None):
+        self.model = model
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self._options = (engine, normalize, tie_break, trellis)
+        self._shm: List[shared_memory.SharedMemory] = []
+        tables = {}
+        try:
+            for name in _SHARED_TABLES:
+                arr = getattr(model, name)
+                shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+                self._shm.append(shm)
+                np.ndarray(arr.shape, dtype=np.float32, buffer=shm.buf)[...] = arr
+                tables[name] = (shm.name, arr.shape)
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_attach_model,
+                initargs=(model.key, model.N, model.M, tables, self._options))
+        except Exception:
+            self._release()
+            raise
+
+    def __call__(self, sequences) -> List[Tuple[List[int], float]]:
+        """Decode `sequences`; with normalize, those of at least TIME_PARALLEL_MIN_LENGTH
+        symbols are split in time (decode_long) and their paths are NumPy arrays."""
+        check_observations(sequences, self.model.M)
+        sequences = list(sequences)
+        if self.workers == 1:
+            return decode_prepared(self.model, sequences, *self._options)
+        results: List[Tuple[List[int], float]] = [None] * len(sequences)
+        rest = []
+        for i, seq in enumerate(sequences):
+            if self._options[1] and len(seq) >= TIME_PARALLEL_MIN_LENGTH:
+                results[i] = self.decode_long(seq)
+            else:
+                rest.append(i)
+        if len(rest) < 2:
+            for i in rest:
+                results[i] = decode_prepared(self.model, [sequences[i]], *self._options)[0]
+            return results
+        chunks = balance_chunks([len(sequences[i]) for i in rest],
+                                min(len(rest), self.workers * CHUNKS_PER_WORKER))
+        futures = [self._pool.submit(_decode_chunk, [sequences[rest[i]] for i in chunk]) for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            for i, result in zip(chunk, future.result()):
+                results[rest[i]] = result
+        return results
+
+    def decode_long(self, obs) -> Tuple[np.ndarray, float]:
+        """Decode one long sequence split in time over the pool (normalize=True only).
+
+        1. Every segment is run forward from an all-zero metric row (segment 0
+           from the true first row), in parallel.
+        2. Going forward, each segment is rerun from its true start row until
+           a row equals the speculative one bit for bit; from there on the
+           speculative rows are the true ones, so its true end row is known.
+           A segment that does not converge within SPECULATION_WINDOW steps
+           is recomputed in full here. Segment k is submitted to step 3 as
+           soon as its start row is known.
+        3. Every segment recomputes its backpointers from its true start row
+           and traces all N survivors back until they merge (_trace_segment).
+        4. The pieces are stitched together from the last state backwards.
+
+        Only the normalized recursion can converge bit for bit (raw float32
+        metrics keep an offset that depends on the start row), so the result
+        is identical to decode_prepared(..., normalize=True) for the same
+        tie_break: path (1-based, as a NumPy array like run_viterbi_lowmem)
+        and log-probability. The forward pass runs about twice.
+        """
+        normalize, tie_break = self._options[1:3]
+        if not normalize:
+            raise ValueError("time-parallel decoding needs normalize=True")
+        model = self.model
+        T = len(obs)
+        if T < 2 or self.workers == 1:
+            path, logprob = decode_prepared(model, [obs], *self._options)[0]
+            return np.asarray(path, dtype=_backpointer_dtype(model.N + 1)), logprob
+        oidx = (np.asarray(obs, dtype=np.int64) - 1).astype(np.int32)
+        step = dict(normalize=True, tie_break=tie_break)
+        bounds = np.linspace(0, T - 1, min(self.workers, T - 1) + 1).round().astype(np.int64)
+        segments = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+        V0 = model.A_start + model.B[:, oidx[0]]
+        offset = float(_normalize_rows(V0))
+        speculative = [self._pool.submit(_speculate_segment, oidx[t0:t1 + 1], V0 if k == 0 else None)
+                       for k, (t0, t1) in enumerate(segments)]
+        traces = []
+        row = V0
+        for k, (t0, t1) in enumerate(segments):
+            traces.append(self._pool.submit(_trace_segment, oidx[t0:t1 + 1], row))
+            rows, end_row = speculative[k].result()
+            if k > 0:
+                end_row = _converge(row, oidx[t0:t1 + 1], rows, end_row, model, tie_break)
+            row = end_row
+
+        best_last = int(_argbest(row, 0, tie_break))
+        pieces = [future.result() for future in traces]
+        for maxima, _, _ in pieces:  # same summation order as the serial decoders
+            offset = float(np.cumsum(np.concatenate(([offset], maxima)))[-1])
+        logprob = float(np.float32(offset + float(row[best_last])))
+
+        path = np.empty(T, dtype=_backpointer_dtype(model.N + 1))
+        state = best_last
+        for (t0, t1), (_, tail, head) in zip(reversed(segments), reversed(pieces)):
+            path[t1 - np.arange(len(tail))] = tail[:, state]
+            if head is None:
+                state = int(tail[-1, state])
+            else:
+                path[t0:t0 + len(head)] = head
+                state = int(head[0])
+        path += 1
+        return path, logprob
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+        self._release()
+
+    def _release(self) -> None:
+        for shm in self._shm:
+            shm.close()
+            shm.unlink()
+        self._shm = []
+
+    def __enter__(self) -> "ParallelDecoder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+# ---- parallel-in-time decoding ----
+
+TIME_PARALLEL_MIN_LENGTH = 1 << 16  # ParallelDecoder splits normalized sequences this long in time
+SPECULATION_WINDOW = 256            # steps a segment may take to converge before it is recomputed
+
+def _speculate_segment(oidx: np.ndarray, start_row: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """decode_long step 1 for the segment whose boundary symbol is oidx[0]: run it from
+    start_row (None = all zeros); returns its first SPECULATION_WINDOW rows and its last row."""
+    model, tie_break = _worker_model, _worker_options[2]
+    L = len(oidx) - 1
+    row = np.zeros(model.N, dtype=np.float32) if start_row is None else start_row
+    rows = np.empty((0 if start_row is not None else min(SPECULATION_WINDOW, L), model.N), dtype=np.float32)
+    for i in range(len(rows)):
+        row, _ = _forward_segment(row, oidx, i, i + 1, model.A_trans, model.B,
+                                  normalize=True, tie_break=tie_break)
+        rows[i] = row
+    row, _ = _forward_segment(row, oidx, len(rows), L, model.A_trans, model.B,
+                              normalize=True, tie_break=tie_break)
+    return rows, row
+
+def _converge(row: np.ndarray, oidx: np.ndarray, rows: np.ndarray, end_row: np.ndarray,
+              model: ViterbiModel, tie_break: str) -> np.ndarray:
+    """decode_long step 2: the true last row of a segment, given its true first row and
+    its speculative rows (_speculate_segment)."""
+    for i in range(len(rows)):
+        row, _ = _forward_segment(row, oidx, i, i + 1, model.A_trans, model.B,
+                                  normalize=True, tie_break=tie_break)
+        if np.array_equal(row.view(np.uint32), rows[i].view(np.uint32)):
+            return end_row
+    row, _ = _forward_segment(row, oidx, len(rows), len(oidx) - 1, model.A_trans, model.B,
+                              normalize=True, tie_break=tie_break)
+    return row
+
+def _trace_segment(oidx: np.ndarray, start_row: np.ndarray) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """decode_long step 3: rerun a segment from its true first row and trace it back.
+
+    Returns the maxima subtracted at each step, `tail` (row r: the state r steps
+    before the segment end, for each of the N end states) and `head` (the states
+    from the segment start up to where all survivors merged; None if they never
+    did, then `tail` covers the whole segment). States are 0-based.
+    """
+    model, tie_break = _worker_model, _worker_options[2]
+    L = len(oidx) - 1
+    backp = np.empty((L, model.N), dtype=_backpointer_dtype(model.N))
+    maxima = np.empty(L, dtype=np.float32)
+    _forward_segment(start_row, oidx, 0, L, model.A_trans, model.B, backp,
+                     normalize=True, tie_break=tie_break, maxima=maxima)
+    cur = np.arange(model.N, dtype=backp.dtype)
+    tail = [cur]
+    t = L
+    while t > 0 and (cur != cur[0]).any():
+        cur = backp[t - 1][cur]
+        tail.append(cur)
+        t -= 1
+    if (cur != cur[0]).any():
+        return maxima, np.stack(tail), None
+    head = np.empty(t + 1, dtype=backp.dtype)
+    s = int(cur[0])
+    head[t] = s
+    for u in range(t, 0, -1):
+        s = int(backp[u - 1, s])
+        head[u - 1] = s
+    return maxima, np.stack(tail), head
+
+# ---- utilities for output formatting ----
+
+def float32_to_hex32(f: float) -> str:
+    b = struct.pack("<f", np.float32(f).item())
+    ui = struct.unpack("<I", b)[0]
+    return f"{ui:08x}"
+
+def write_output_records(f, outputs: List[Tuple[List[int], float]]) -> None:
+    """Write decoded (path, log-prob) pairs to an open text stream, without the final 0 line."""
+    for states, lp in outputs:
+        f.write("".join(f"{st:08x}\n" for st in states))
+        f.write(f"{float32_to_hex32(lp)}\n")
+        f.write("ffffffff\n")
+
+def write_output_file(path: str, outputs: List[Tuple[List[int], float]]) -> None:
+    """Write decoded (path, log-prob) pairs in the output_p.dat / output.dat format."""
+    with open(path, "w", encoding="utf-8") as f:
+        write_output_records(f, outputs)
+        f.write("00000000\n")
+
+# ---- streaming decode ----
+
+STREAM_CHUNK_BYTES = 1 << 20
+_STREAM_SNIFF_MIN_BYTES = 64
+
+def iter_word_chunks(f, chunk_bytes: int = STREAM_CHUNK_BYTES) -> Iterator[np.ndarray]:
+    """Read a binary stream incrementally and yield uint32 word arrays.
+
+    The format (text or binary) is sniffed once, on the first chunk. Text
+    tokens and binary words that straddle a chunk boundary are carried over
+    to the next chunk. On pipes, read1 returns whatever is available instead
+    of waiting for a full chunk, which keeps output latency low.
+    """
+    read = getattr(f, "read1", f.read)
+    carry = b""
+    fmt = None
+    while True:
+        data = read(chunk_bytes)
+        eof = not data
+        data = carry + data
+        if fmt is None:
+            if not data:
+                return
+            fmt = sniff_bytes(data[:_SNIFF_BYTES])
+            if fmt == "text" and not eof and len(data) < _STREAM_SNIFF_MIN_BYTES:
+                fmt = None # Too little to rule out binary yet
+                carry = data
+                continue
+        if fmt == "binary":
+            cut = len(data) if eof else len(data) - len(data) % 4
+            if eof and cut % 4:
+                raise ValueError("Binary length is not multiple of 4")
+            carry, data = data[cut:], data[:cut]
+            if data:
+                yield np.frombuffer(data, dtype="<u4")
+        else:
+            cut = len(data) if eof else max(data.rfind(b) for b in (b" ", b"\t", b"\r", b"\n")) + 1
+            carry, data = data[cut:], data[:cut]
+            words = parse_hex_words(data)
+            if words is None:
+                words = np.array([parse_token_as_int(t) for t in data.decode("ascii").split()],
+                                 dtype=np.uint32)
+            if words.size:
+                yield words
+        if eof:
+            return
+
+def iter_sequence_batches(chunks: Iterable[np.ndarray]) -> Iterator[List[np.ndarray]]:
+    """Turn a stream of word chunks into lists of int64 sequences, one list per chunk.
+
+    A sequence is emitted as soon as its 0xFFFFFFFF terminator has been read;
+    the same end-of-stream and empty-sequence rules as split_sequences apply.
+    Only the words of the current, unterminated sequence are kept between chunks.
+    """
+    pending: List[np.ndarray] = []
+    after_marker = False
+    for words in chunks:
+        if after_marker and words[0] == 0:
+            return
+        done: List[np.ndarray] = []
+        start = 0
+        stop = False
+        for m in np.flatnonzero(words == 0xFFFFFFFF).tolist():
+            pending.append(words[start:m])
+            seq = np.concatenate(pending).astype(np.int64)
+            pending = []
+            if seq.size:
+                done.append(seq)
+            start = m + 1
+            if start < words.size and words[start] == 0:
+                stop = True
+                break
+        if not stop:
+            pending.append(words[start:].copy())
+            after_marker = start == words.size
+        if done:
+            yield done
+        if stop:
+            return
+    if pending:
+        seq = np.concatenate(pending).astype(np.int64)
+        if seq.size:
+            yield [seq]
+
+def decode_stream(fin, fout, decoder: Callable[[List[np.ndarray]], List[Tuple[List[int], float]]],
+                  chunk_bytes: int = STREAM_CHUNK_BYTES) -> int:
+    """Decode input.dat from binary stream `fin` to text stream `fout` with bounded memory.
+
+    Sequences completed by each chunk are decoded together and written (and
+    flushed) immediately, so results appear while the input is still arriving.
+    Returns the number of sequences written.
+    """
+    count = 0
+    for batch in iter_sequence_batches(iter_word_chunks(fin, chunk_bytes)):
+        write_output_records(fout, decoder(batch))
+        fout.flush()
+        count += len(batch)
+    fout.write("00000000\n")
+    fout.flush()
+    return count
+
+# ---- main flow ----
+
+def parse_args(argv=None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Golden Viterbi model: N.dat/A.dat/B.dat/input.dat -> output_p.dat")
+    ap.add_argument("--low-memory", action="store_true",
+                    help="decode one sequence at a time with rolling metric rows and uint8 backpointers")
+    ap.add_argument("--checkpoint-interval", type=int, default=None, metavar="K",
+                    help="with --low-memory, keep a metric checkpoint every K steps instead of all backpointers")
+    ap.add_argument("--engine", choices=ENGINES, default=None,
+                    help=f"decoding engine (default: ${ENGINE_ENV_VAR} or 'auto' = numba if installed)")
+    ap.add_argument("--input", default="input.dat",
+                    help="observation file, or '-' for stdin (implies --stream)")
+    ap.add_argument("--output", default="output_p.dat",
+                    help="result file, or '-' for stdout (implies --stream)")
+    ap.add_argument("--stream", action="store_true",
+                    help="read the input incrementally and write each result as soon as it is decoded")
+    ap.add_argument("--dut-adder", action="store_true",
+                    help="add with the bit-accurate FPadder32Pipelined model (fpadder_model.py) instead of IEEE float32")
+    ap.add_argument("--normalize", action="store_true",
+                    help="subtract the maximum metric after every step and add the summed offset back to the log-probability")
+    ap.add_argument("--tie-break", choices=TIE_BREAKS, default="first",
+                    help="'first': lowest state among equal metrics (np.argmax); "
+                         "'dut': the DUT comparator (unsigned '<' on the float32 bit patterns)")
+    ap.add_argument("--sparse", action="store_true",
+                    help="run add-compare-select over the transitions above --sparse-threshold only (same output)")
+    ap.add_argument("--sparse-threshold", type=float, default=SPARSE_THRESHOLD, metavar="X",
+                    help=f"with --sparse, transitions with A_trans <= X are pruned (default {SPARSE_THRESHOLD:g})")
+    ap.add_argument("--beam", type=int, default=None, metavar="K",
+                    help="approximate decoding: extend only the K best states at every step")
+    ap.add_argument("--beam-margin", type=float, default=None, metavar="X",
+                    help="approximate decoding: extend only the states within X of the best metric")
+    ap.add_argument("--beam-check", type=float, nargs="?", const=1.0, default=None, metavar="F",
+                    help="with --beam/--beam-margin, also decode a random share F (default 1) of the "
+                         "sequences exactly and report how often the results differ")
+    ap.add_argument("--workers", type=int, default=1, metavar="W",
+                    help="decode on W processes with the model in shared memory (0 = all cores; default 1); "
+                         "with --normalize, sequences of TIME_PARALLEL_MIN_LENGTH symbols or more are split in time")
+    args = ap.parse_args(argv)
+    if args.sparse and (args.low_memory or args.dut_adder):
+        ap.error("--sparse cannot be combined with --low-memory or --dut-adder")
+    if args.workers != 1 and (args.low_memory or args.dut_adder):
+        ap.error("--workers cannot be combined with --low-memory or --dut-adder")
+    beam = args.beam is not None or args.beam_margin is not None
+    if beam and (args.low_memory or args.dut_adder or args.sparse or args.workers != 1):
+        ap.error("--beam/--beam-margin cannot be combined with --low-memory, --dut-adder, --sparse or --workers")
+    if args.beam_check is not None and not beam:
+        ap.error("--beam-check needs --beam or --beam-margin")
+    return args
+
+def make_decoder(args: argparse.Namespace, N: int, M: int, A_start: np.ndarray,
+                 A_trans: np.ndarray, B: np.ndarray) -> Callable[[List[np.ndarray]], List[Tuple[List[int], float]]]:
+    """Return a function decoding a list of sequences with the mode selected on the command line."""
+    opts = dict(normalize=args.normalize, tie_break=args.tie_break)
+    trellis = build_sparse_trellis(A_trans, args.sparse_threshold) if args.sparse else None
+    if args.dut_adder:
+        from fpadder_model import fp_add
+
+        def run(sequences):
+            check_observations(sequences, M)
+            return [run_viterbi_for_sequence(seq, N, M, A_start, A_trans, B, adder=fp_add, **opts)
+                    for seq in sequences]
+    elif args.low_memory:
+        def run(sequences):
+            check_observations(sequences, M)
+            return [run_viterbi_lowmem(seq, N, M, A_start, A_trans, B,
+                                       checkpoint_interval=args.checkpoint_interval, **opts)
+                    for seq in sequences]
+    elif args.beam is not None or args.beam_margin is not None:
+        def run(sequences):
+            check_observations(sequences, M)
+            return [run_viterbi_beam(seq, N, M, A_start, A_trans, B, args.beam, args.beam_margin, **opts)
+                    for seq in sequences]
+        if args.beam_check is not None:
+            return BeamAudit(run, lambda sequences: decode(N, M, A_start, A_trans, B, sequences,
+                                                           engine=args.engine, **opts),
+                             args.beam_check)
+    elif args.workers != 1:
+        return ParallelDecoder(prepare_model(N, M, A_start, A_trans, B), args.workers,
+                               args.engine, trellis=trellis, **opts)
+    else:
+        def run(sequences):
+            return decode(N, M, A_start, A_trans, B, sequences, engine=args.engine,
+                          trellis=trellis, **opts)
+    return run
+
+def main(argv=None):
+    args = parse_args(argv)
+    fn_N = "N.dat"
+    fn_A = "A.dat"
+    fn_B = "B.dat"
+    fn_input = args.input
+    fn_output = args.output
+    stream = args.stream or fn_input == "-" or fn_output == "-"
+
+    for fn in (fn_N, fn_A, fn_B, fn_input):
+        if fn != "-" and not os.path.exists(fn):
+            print(f"Error: required file '{fn}' not found.", file=sys.stderr)
+            return
+
+    N, M = read_N_file(fn_N)
+    if N <= 0 or M <= 0:
+        raise RuntimeError("Invalid N or M")
+
+    A_start, A_trans = read_A_file(fn_A, N)
+    B = read_B_file(fn_B, N, M)
+    decoder = make_decoder(args, N, M, A_start, A_trans, B)
+
+    with contextlib.ExitStack() as stack:
+        if isinstance(decoder, ParallelDecoder):
+            stack.enter_context(decoder)
+        if stream:
+            fin = sys.stdin.buffer if fn_input == "-" else stack.enter_context(open(fn_input, "rb"))
+            fout = sys.stdout if fn_output == "-" else stack.enter_context(
+                open(fn_output, "w", encoding="utf-8"))
+            count = decode_stream(fin, fout, decoder)
+        else:
+            sequences = read_input_file(fn_input)
+            outputs = decoder(sequences)
+            write_output_file(fn_output, outputs)
+    if stream:
+        print(f"Wrote {fn_output} with {count} sequences.",
+              file=sys.stderr if fn_output == "-" else sys.stdout)
+    else:
+        print(f"Wrote {fn_output} with {len(outputs)} sequences.")
+    if isinstance(decoder, BeamAudit):
+        print(decoder.summary(), file=sys.stderr if fn_output == "-" else sys.stdout)
+
+if __name__ == "__main__":
+    main()
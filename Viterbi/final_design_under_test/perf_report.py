@@ -0,0 +1,148 @@
+"""
+perf_report.py
+
+Turns the per-sequence performance counters of a DUT_PERF simulator build
+(perf.csv, written by testviterbi.bsv) into cycles/symbol, throughput at each
+synthesized clock period, and stall / FIFO occupancy breakdowns by N and M.
+
+perf.csv holds one row per decoded sequence with running totals taken when the
+sequence's 0xFFFFFFFF terminator is output, so a sequence's cycles are the
+interval since the previous sequence completed (the first one counts from
+reset). Counters:
+- inter_stall : cycles with vt_inter_is_ready low (stage 1 waits for the
+                transition maxima before the emission pass)
+- stall       : cycles with vt_is_ready low (stage 1 waits for the emission pass
+                before the next time step)
+- clear_dly   : cycles spent in the clear_*_stall_dly one-cycle delays
+- busy_<fifo> : cycles the FIFO holds at least one entry
+- full_<fifo> : cycles the (size-2) FIFO is full
+
+Build and run:
+    make b_compile SIMDEFINES=DUT_PERF BUILDDIR=intermediate_perf/
+    intermediate_perf/mkfile_io_bsim -V
+    python perf_report.py [RUN_DIR ...] [--by N,M] [--csv per_sequence.csv]
+"""
+
+import argparse
+import csv
+import os
+import sys
+from collections import OrderedDict
+from typing import Dict, List, Sequence
+
+import golden_viterbi
+
+PERF_FILE = "perf.csv"
+# Synthesized clock periods: baseline design, pipelined datapath, pipelined adder.
+CLOCK_PERIODS_NS = (6.0, 3.65, 2.8)
+STALL_COUNTERS = ("inter_stall", "stall", "clear_dly")
+# Same order as DutPerf_t.notEmpty / .full in dut.bsv
+PERF_FIFOS = ("inp", "mem", "add", "meta", "com", "trace", "max")
+COUNTERS = ("cycles",) + STALL_COUNTERS + tuple(f"busy_{f}" for f in PERF_FIFOS) \
+    + tuple(f"full_{f}" for f in PERF_FIFOS)
+
+# ---- reading ----
+
+def read_perf_file(path: str) -> List[Dict[str, int]]:
+    """Per-sequence counter values (running totals turned into differences)."""
+    with open(path, "r", newline="") as f:
+        totals = [{k: int(v) for k, v in row.items()} for row in csv.DictReader(f)]
+    rows = []
+    prev = dict.fromkeys(COUNTERS, 0)
+    for total in totals:
+        rows.append({"seq": total["seq"], **{k: total[k] - prev[k] for k in COUNTERS}})
+        prev = total
+    return rows
+
+def analyze_run(run_dir: str = ".") -> List[Dict[str, int]]:
+    """Join a run's perf.csv with its N.dat and input.dat: one dict per sequence with N, M, T and counters."""
+    N, M = golden_viterbi.read_N_file(os.path.join(run_dir, "N.dat"))
+    lengths = [len(s) for s in golden_viterbi.read_input_file(os.path.join(run_dir, "input.dat"))]
+    rows = read_perf_file(os.path.join(run_dir, PERF_FILE))
+    if len(rows) != len(lengths):
+        raise ValueError(f"{run_dir}: {PERF_FILE} has {len(rows)} sequences, input.dat has {len(lengths)}")
+    return [{"N": N, "M": M, "T": T, **row} for row, T in zip(rows, lengths)]
+
+# ---- summaries ----
+
+def summarize(rows: Sequence[Dict[str, int]], by: Sequence[str] = ("N", "M")) -> List[Dict[str, float]]:
+    """Aggregate per-sequence rows into groups keyed by `by` (e.g. ("N",), ("M",), ("N", "M")).
+
+    Each group reports symbols, cycles, cycles/symbol, Msymbols/s at every
+    CLOCK_PERIODS_NS entry, and each stall / FIFO counter as a fraction of cycles.
+    """
+    groups: "OrderedDict[tuple, Dict[str, int]]" = OrderedDict()
+    for row in sorted(rows, key=lambda r: tuple(r[k] for k in by)):
+        key = tuple(row[k] for k in by)
+        acc = groups.setdefault(key, {"sequences": 0, "symbols": 0, **dict.fromkeys(COUNTERS, 0)})
+        acc["sequences"] += 1
+        acc["symbols"] += row["T"]
+        for k in COUNTERS:
+            acc[k] += row[k]
+
+    summary = []
+    for key, acc in groups.items():
+        cycles = max(acc["cycles"], 1)
+        entry = dict(zip(by, key))
+        entry.update(sequences=acc["sequences"], symbols=acc["symbols"], cycles=acc["cycles"],
+                     cycles_per_symbol=acc["cycles"] / max(acc["symbols"], 1))
+        for period in CLOCK_PERIODS_NS:
+            entry[f"msym_s@{period}ns"] = acc["symbols"] / (cycles * period) * 1e3
+        for k in COUNTERS[1:]:
+            entry[k] = acc[k] / cycles
+        summary.append(entry)
+    return summary
+
+def format_summary(summary: Sequence[Dict[str, float]], by: Sequence[str] = ("N", "M")) -> str:
+    """Fixed-width table of the headline numbers (cycles/symbol, throughput, stall fractions)."""
+    cols = list(by) + ["sequences", "symbols", "cycles_per_symbol"] \
+        + [f"msym_s@{p}ns" for p in CLOCK_PERIODS_NS] + list(STALL_COUNTERS) \
+        + [f"full_{f}" for f in PERF_FIFOS]
+    widths = [max(10, len(c)) for c in cols]
+    lines = [" ".join(f"{c:>{w}}" for c, w in zip(cols, widths))]
+    for entry in summary:
+        cells = []
+        for c, w in zip(cols, widths):
+            v = entry[c]
+            if c in STALL_COUNTERS or c.startswith("full_"):
+                cells.append(f"{100 * v:>{w - 1}.1f}%")
+            elif isinstance(v, float):
+                cells.append(f"{v:>{w}.2f}")
+            else:
+                cells.append(f"{v:>{w}}")
+        lines.append(" ".join(cells))
+    return "\n".join(lines)
+
+def write_rows_csv(path: str, rows: Sequence[Dict]) -> None:
+    """Write per-sequence rows or summary entries as CSV (columns from the first row)."""
+    if not rows:
+        return
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+# ---- main flow ----
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Summarize DUT_PERF counters (perf.csv) per N and M")
+    ap.add_argument("run_dirs", nargs="*", default=["."],
+                    help="directories holding perf.csv, N.dat and input.dat")
+    ap.add_argument("--by", default="N,M", help="comma-separated grouping keys out of N, M, T")
+    ap.add_argument("--csv", default=None, help="also write the per-sequence rows to this CSV")
+    args = ap.parse_args(argv)
+
+    by = tuple(k.strip() for k in args.by.split(",") if k.strip())
+    rows = []
+    for run_dir in args.run_dirs:
+        rows.extend(analyze_run(run_dir))
+    if not rows:
+        print("No sequences found.", file=sys.stderr)
+        return 1
+    print(format_summary(summarize(rows, by), by))
+    if args.csv:
+        write_rows_csv(args.csv, rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
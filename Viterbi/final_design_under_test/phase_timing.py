@@ -0,0 +1,127 @@
+"""
+phase_timing.py
+
+Per-phase timing (and optional cProfile capture) for verification_script.py.
+
+Each batch times its phases into its timings dict:
+- datagen : generate_all_test_data (random model, input.dat, .dat files)
+- bins    : coverage-bin measurement of the generated data (stimulus_coverage)
+- golden  : golden model, in-process decode() or the golden_viterbi.py subprocess
+            (interpreter start-up included)
+- sim     : the simulator run; with --make-per-test this includes 'make b_sim'
+            compilation, otherwise the one-off compile is logged separately
+- compare : streamed comparison of output_p.dat and output.dat
+
+At the end of a session the batches are summarized per phase (count, mean,
+median, p95, max, total and share of the total) and written one row per batch
+to a CSV file. With profiling, the Python phases of each batch also run under
+cProfile; the per-batch .prof files are merged per phase afterwards and can be
+read with pstats or snakeviz.
+"""
+
+import contextlib
+import cProfile
+import csv
+import math
+import os
+import pstats
+import statistics
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+PHASES = ("datagen", "bins", "golden", "sim", "compare")
+BATCH_COLUMNS = ("test", "N", "M", "Num_Seq", "seed", "outcome")
+PROFILE_TOP = 25  # functions listed in each <phase>.txt
+
+# ---- timing ----
+
+class PhaseTimer:
+    """Adds the wall time of named phases to `timings` (seconds, summed per name).
+
+    With `profile_prefix`, phases entered with profile=True also run under
+    cProfile and are dumped to '<profile_prefix>_<phase>.prof'.
+    """
+
+    def __init__(self, timings: Dict, profile_prefix: Optional[str] = None):
+        self.timings = timings
+        self.profile_prefix = profile_prefix
+
+    @contextlib.contextmanager
+    def phase(self, name: str, profile: bool = True):
+        profiler = cProfile.Profile() if self.profile_prefix and profile else None
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+            if profiler:
+                profiler.dump_stats(f"{self.profile_prefix}_{name}.prof")
+
+def batch_row(batch, outcome: str, timings: Dict) -> Dict:
+    """One CSV row: the batch, its outcome and the seconds of every phase it reached."""
+    row = dict(zip(BATCH_COLUMNS, (*batch, outcome)))
+    row.update({p: timings[p] for p in PHASES if p in timings})
+    return row
+
+# ---- summaries ----
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100) of a non-empty sequence."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def summarize(rows: Iterable[Dict]) -> List[Dict[str, float]]:
+    """Per-phase statistics over the batches that reached each phase."""
+    rows = list(rows)
+    samples = {p: [r[p] for r in rows if p in r] for p in PHASES}
+    grand_total = sum(sum(v) for v in samples.values()) or 1.0
+    summary = []
+    for phase, values in samples.items():
+        if not values:
+            continue
+        summary.append({"phase": phase, "count": len(values), "mean": statistics.fmean(values),
+                        "median": statistics.median(values), "p95": percentile(values, 95),
+                        "max": max(values), "total": sum(values),
+                        "share": sum(values) / grand_total})
+    return summary
+
+def format_summary(summary: Sequence[Dict[str, float]]) -> str:
+    """Fixed-width table of summarize() output; times in milliseconds."""
+    lines = [f"{'phase':<8} {'count':>6} {'mean ms':>10} {'median ms':>10} {'p95 ms':>10} "
+             f"{'max ms':>10} {'total s':>9} {'share':>6}"]
+    for s in summary:
+        lines.append(f"{s['phase']:<8} {s['count']:>6} {s['mean'] * 1e3:>10.1f} {s['median'] * 1e3:>10.1f} "
+                     f"{s['p95'] * 1e3:>10.1f} {s['max'] * 1e3:>10.1f} {s['total']:>9.2f} "
+                     f"{100 * s['share']:>5.1f}%")
+    return "\n".join(lines)
+
+def write_csv(path: str, rows: Sequence[Dict]) -> None:
+    """One row per batch; phases a batch did not reach are left empty."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(BATCH_COLUMNS + PHASES))
+        writer.writeheader()
+        writer.writerows(rows)
+
+# ---- profiles ----
+
+def merge_profiles(prefixes: Iterable[str], out_dir: str) -> List[str]:
+    """Merge '<prefix>_<phase>.prof' files per phase into out_dir/<phase>.prof and a
+    readable out_dir/<phase>.txt (top PROFILE_TOP by cumulative time). Returns the phases merged."""
+    prefixes = list(prefixes)
+    merged = []
+    for phase in PHASES:
+        paths = [f"{p}_{phase}.prof" for p in prefixes if os.path.exists(f"{p}_{phase}.prof")]
+        if not paths:
+            continue
+        stats = pstats.Stats(*paths)
+        stats.dump_stats(os.path.join(out_dir, f"{phase}.prof"))
+        with open(os.path.join(out_dir, f"{phase}.txt"), "w", encoding="utf-8") as f:
+            stats.stream = f
+            stats.files = []  # skip the header line per merged file
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+        merged.append(phase)
+    return merged
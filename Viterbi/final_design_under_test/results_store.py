@@ -0,0 +1,138 @@
+"""
+results_store.py
+
+SQLite store of regression results for verification_script.py.
+
+Every batch is recorded with its parameters (N, M, Num_Seq), data seed, the
+hash of the DUT's .bsv sources, the hash of the Python sources that produce
+its stimulus and expected output (verification_script.STIMULUS_SOURCES) and
+its outcome, as soon as it finishes, so a killed session loses nothing. A
+batch that already passed with the same parameters, seed and both hashes is
+skipped on later runs, and the batch plan of each session is stored so an
+interrupted session can be resumed.
+
+Tables:
+    sessions(id, started, dut_hash, num_tests, finished)
+    batches(session_id, test_num, n, m, num_seq, seed)      -- the session plan
+    results(dut_hash, stimulus_hash, n, m, num_seq, seed, outcome,
+            sim_seconds, session_id, test_num, recorded)    -- latest outcome per key
+
+Databases written before stimulus_hash existed are migrated on open; their
+results get an empty stimulus hash, so those batches are run again.
+"""
+
+import datetime
+import sqlite3
+from typing import List, Optional, Set, Tuple
+
+Batch = Tuple[int, int, int, int, int]  # (test_num, N, M, Num_Seq, seed)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    started   TEXT NOT NULL,
+    dut_hash  TEXT NOT NULL,
+    num_tests INTEGER NOT NULL,
+    finished  INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS batches (
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    test_num   INTEGER NOT NULL,
+    n          INTEGER NOT NULL,
+    m          INTEGER NOT NULL,
+    num_seq    INTEGER NOT NULL,
+    seed       TEXT NOT NULL,
+    PRIMARY KEY (session_id, test_num)
+);
+CREATE TABLE IF NOT EXISTS results (
+    dut_hash      TEXT NOT NULL,
+    stimulus_hash TEXT NOT NULL,
+    n           INTEGER NOT NULL,
+    m           INTEGER NOT NULL,
+    num_seq     INTEGER NOT NULL,
+    seed        TEXT NOT NULL,
+    outcome     TEXT NOT NULL,
+    sim_seconds REAL,
+    session_id  INTEGER,
+    test_num    INTEGER,
+    recorded    TEXT NOT NULL,
+    PRIMARY KEY (dut_hash, stimulus_hash, n, m, num_seq, seed)
+);
+"""
+_RESULT_COLUMNS = "n, m, num_seq, seed, outcome, sim_seconds, session_id, test_num, recorded"
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+class ResultsStore:
+    """Thin wrapper around the results database (seeds are stored as text: they are 64-bit unsigned)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self._migrate()
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+
+    def _migrate(self) -> None:
+        """Rebuild a results table without stimulus_hash (its key changed) with an empty one."""
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(results)")]
+        if not columns or "stimulus_hash" in columns:
+            return
+        with self.conn:
+            self.conn.execute("ALTER TABLE results RENAME TO results_old")
+            self.conn.executescript(_SCHEMA)
+            self.conn.execute(f"INSERT INTO results (dut_hash, stimulus_hash, {_RESULT_COLUMNS}) "
+                              f"SELECT dut_hash, '', {_RESULT_COLUMNS} FROM results_old")
+            self.conn.execute("DROP TABLE results_old")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # ---- sessions ----
+
+    def create_session(self, dut_hash: str, batches: List[Batch]) -> int:
+        """Store a new session and its batch plan; returns the session id."""
+        with self.conn:
+            cur = self.conn.execute("INSERT INTO sessions (started, dut_hash, num_tests) VALUES (?, ?, ?)",
+                                    (_now(), dut_hash, len(batches)))
+            session_id = cur.lastrowid
+            self.conn.executemany(
+                "INSERT INTO batches (session_id, test_num, n, m, num_seq, seed) VALUES (?, ?, ?, ?, ?, ?)",
+                [(session_id, t, N, M, S, str(seed)) for t, N, M, S, seed in batches])
+        return session_id
+
+    def last_unfinished_session(self) -> Optional[int]:
+        row = self.conn.execute("SELECT id FROM sessions WHERE finished = 0 ORDER BY id DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def session_batches(self, session_id: int) -> List[Batch]:
+        """The batch plan of a stored session, in test order."""
+        rows = self.conn.execute(
+            "SELECT test_num, n, m, num_seq, seed FROM batches WHERE session_id = ? ORDER BY test_num",
+            (session_id,)).fetchall()
+        return [(t, N, M, S, int(seed)) for t, N, M, S, seed in rows]
+
+    def finish_session(self, session_id: int) -> None:
+        with self.conn:
+            self.conn.execute("UPDATE sessions SET finished = 1 WHERE id = ?", (session_id,))
+
+    # ---- results ----
+
+    def record(self, dut_hash: str, stimulus_hash: str, batch: Batch, outcome: str,
+               sim_seconds: Optional[float] = None, session_id: Optional[int] = None) -> None:
+        """Store (or replace) the outcome of one batch; committed immediately."""
+        test_num, N, M, Num_Seq, seed = batch
+        with self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO results (dut_hash, stimulus_hash, {_RESULT_COLUMNS})"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (dut_hash, stimulus_hash, N, M, Num_Seq, str(seed), outcome, sim_seconds,
+                 session_id, test_num, _now()))
+
+    def passed_keys(self, dut_hash: str, stimulus_hash: str) -> Set[Tuple[int, int, int, int]]:
+        """(N, M, Num_Seq, seed) of every batch that passed against this DUT and stimulus hash."""
+        rows = self.conn.execute(
+            "SELECT n, m, num_seq, seed FROM results WHERE dut_hash = ? AND stimulus_hash = ?"
+            " AND outcome = 'passed'", (dut_hash, stimulus_hash)).fetchall()
+        return {(N, M, S, int(seed)) for N, M, S, seed in rows}
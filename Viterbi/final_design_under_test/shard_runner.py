@@ -0,0 +1,175 @@
+"""
+shard_runner.py
+
+Runs an arbitrarily large input.dat through the BSV simulator by splitting it
+into DUT-sized shards at sequence boundaries, simulating the shards on several
+simulator instances at once, and merging their output.dat files back into one
+ordered result (optionally checked against the golden model).
+
+DUT / testbench limits (testviterbi.bsv, dut.bsv):
+- input.dat is loaded with mkRegFileLoad(..., 0, 1023): at most 1024 words per
+  run, counting every 0xFFFFFFFF terminator and the final 0;
+- the per-sequence time counter timeS is 10 bits wide: T <= 1023;
+- traceback entries live in the 1024-word workMem at (t+1)*N offsets, so a
+  sequence needs (T + 1) * N <= 1024.
+
+Usage:
+    python shard_runner.py --input big_input.dat [--model-dir DIR] [--workers 8]
+                           [--output output.dat] [--compare]
+"""
+
+import argparse
+import concurrent.futures
+import logging
+import os
+import shutil
+import sys
+from typing import Iterable, Iterator, List
+
+import numpy as np
+
+import generate_test_data
+import golden_viterbi
+import verification_script
+
+# --- CONFIGURATION ---
+MAX_INPUT_WORDS = 1024   # input_rd RegFile depth in testviterbi.bsv
+MAX_TIME_STEPS = 1023    # Bit#(10) timeS in dut.bsv
+WORK_MEM_WORDS = 1024    # workMem RegFile depth in testviterbi.bsv
+SHARD_ROOT = "shards"
+MODEL_FILES = ("N.dat", "A.dat", "B.dat")
+# --- END CONFIGURATION ---
+
+
+def max_sequence_length(N: int) -> int:
+    """Longest sequence one simulator run can decode for an N-state model."""
+    return min(MAX_TIME_STEPS, WORK_MEM_WORDS // N - 1, MAX_INPUT_WORDS - 2)
+
+def iter_shards(sequences: Iterable[np.ndarray], N: int,
+                max_words: int = MAX_INPUT_WORDS) -> Iterator[List[np.ndarray]]:
+    """Greedily pack consecutive sequences into shards that fit one simulator run.
+
+    Each sequence costs len + 1 words (its terminator); each shard also needs
+    the final 0. Order is preserved, so concatenating shard outputs gives the
+    output of the unsharded input.
+    """
+    limit = max_sequence_length(N)
+    shard: List[np.ndarray] = []
+    used = 1
+    for idx, seq in enumerate(sequences):
+        if len(seq) > limit:
+            raise ValueError(f"Sequence {idx} has {len(seq)} symbols; the DUT handles at most "
+                             f"{limit} for N={N}")
+        cost = len(seq) + 1
+        if shard and used + cost > max_words:
+            yield shard
+            shard, used = [], 1
+        shard.append(seq)
+        used += cost
+    if shard:
+        yield shard
+
+def write_shard(shard_dir: str, model_dir: str, shard: List[np.ndarray]) -> None:
+    """Create a shard directory with the model files and the shard's input.dat (hex text)."""
+    os.makedirs(shard_dir, exist_ok=True)
+    for name in MODEL_FILES:
+        shutil.copy2(os.path.join(model_dir, name), os.path.join(shard_dir, name))
+    words = []
+    for seq in shard:
+        words.append(np.asarray(seq, dtype=np.uint32))
+        words.append(np.array([0xFFFFFFFF], dtype=np.uint32))
+    words.append(np.array([0], dtype=np.uint32))
+    generate_test_data.write_words(os.path.join(shard_dir, "input.dat"),
+                                   np.concatenate(words), "text", pad=False)
+
+def read_output_records(path: str) -> List[str]:
+    """Lines of an output file without the final 0 terminator."""
+    with open(path, "r") as f:
+        lines = f.read().split()
+    if lines and int(lines[-1], 16) == 0 and (len(lines) == 1 or int(lines[-2], 16) == 0xFFFFFFFF):
+        lines.pop()
+    return lines
+
+def merge_outputs(paths: List[str], dest: str) -> None:
+    """Concatenate shard outputs (in order) into one output file with a single final 0."""
+    with open(dest, "w", encoding="utf-8") as f:
+        for path in paths:
+            lines = read_output_records(path)
+            if lines:
+                f.write("\n".join(lines) + "\n")
+        f.write("00000000\n")
+
+def run_shard(shard_dir: str, model, compare: bool) -> bool:
+    """Simulate one shard (and decode it with the golden model if comparing)."""
+    if compare:
+        sequences = golden_viterbi.read_input_file(os.path.join(shard_dir, "input.dat"))
+        outputs = golden_viterbi.decode(model.N, model.M, model.A_start, model.A_trans,
+                                        model.B, sequences,
+                                        tie_break=verification_script.GOLDEN_TIE_BREAK)
+        golden_viterbi.write_output_file(
+            os.path.join(shard_dir, verification_script.EXPECTED_OUTPUT_FILE), outputs)
+    if not verification_script.run_bsv_simulation(cwd=shard_dir):
+        return False
+    return verification_script.compare_output_files(cwd=shard_dir) if compare else True
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Shard a large input.dat across parallel DUT simulations")
+    ap.add_argument("--input", required=True, help="large input.dat (text or binary)")
+    ap.add_argument("--model-dir", default=".", help="directory holding N.dat, A.dat and B.dat")
+    ap.add_argument("--output", default=verification_script.ACTUAL_OUTPUT_FILE,
+                    help="merged simulator output")
+    ap.add_argument("--workers", type=int, default=0, help="parallel simulator instances (0 = all cores)")
+    ap.add_argument("--compare", action="store_true",
+                    help="also decode every shard with the golden model, compare, and write the merged golden output")
+    ap.add_argument("--keep", action="store_true", help="keep shard directories after a successful run")
+    return ap.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+
+    N, M = golden_viterbi.read_N_file(os.path.join(args.model_dir, "N.dat"))
+    A_start, A_trans = golden_viterbi.read_A_file(os.path.join(args.model_dir, "A.dat"), N)
+    B = golden_viterbi.read_B_file(os.path.join(args.model_dir, "B.dat"), N, M)
+    model = golden_viterbi.prepare_model(N, M, A_start, A_trans, B)
+
+    if verification_script.BSV_BUILD_ONCE:
+        built, _ = verification_script.ensure_simulator_built()
+        if not built:
+            return 1
+
+    # Shards are produced lazily from the streaming reader, so the input is never fully in memory.
+    shard_dirs: List[str] = []
+    futures = []
+    with open(args.input, "rb") as fin, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        chunks = golden_viterbi.iter_word_chunks(fin)
+        sequences = (seq for batch in golden_viterbi.iter_sequence_batches(chunks) for seq in batch)
+        for i, shard in enumerate(iter_shards(sequences, N)):
+            shard_dir = os.path.abspath(os.path.join(SHARD_ROOT, f"shard_{i:05d}"))
+            write_shard(shard_dir, args.model_dir, shard)
+            shard_dirs.append(shard_dir)
+            futures.append(pool.submit(run_shard, shard_dir, model, args.compare))
+        results = [f.result() for f in futures]
+
+    failed = [d for d, ok in zip(shard_dirs, results) if not ok]
+    outputs = [os.path.join(d, verification_script.ACTUAL_OUTPUT_FILE) for d in shard_dirs]
+    if all(os.path.exists(p) for p in outputs):
+        merge_outputs(outputs, args.output)
+        logging.info(f"Merged {len(outputs)} shard outputs into {args.output}")
+    if args.compare:
+        merge_outputs([os.path.join(d, verification_script.EXPECTED_OUTPUT_FILE) for d in shard_dirs],
+                      verification_script.EXPECTED_OUTPUT_FILE)
+        logging.info(f"Merged golden output into {verification_script.EXPECTED_OUTPUT_FILE}")
+
+    logging.info(f"Shards: {len(shard_dirs)}, failed: {len(failed)}")
+    for d in failed:
+        logging.info(f"  FAILED: {d}")
+    if not failed and not args.keep:
+        for d in shard_dirs:
+            shutil.rmtree(d, ignore_errors=True)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
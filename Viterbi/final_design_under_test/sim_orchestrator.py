@@ -0,0 +1,161 @@
+"""
+sim_orchestrator.py
+
+asyncio orchestration of simulator processes for verification_script.py.
+
+Several simulator processes run at once, each in its own process group. Their
+stdout/stderr are streamed line by line into the log (DEBUG, prefixed with the
+run's label) instead of being buffered until exit; only the last lines are
+kept for the failure report. Every run has a per-test timeout and the whole
+session an optional global deadline; a run that exceeds either, or whose task
+is cancelled, is sent SIGTERM and, after a grace period, SIGKILL, so a hung
+'make b_sim' or Bluesim binary never blocks the other runs.
+
+The number of simultaneous runs is limited to the CPU count (or a requested
+value) and further to the available memory divided by SIM_MEMORY_BYTES.
+
+Usage:
+    orch = SimOrchestrator(max_concurrent=0, per_test_timeout=300, global_timeout=3600)
+    result = await orch.run("test 0003", ["make", "b_sim"], cwd="scratch/test_0003")
+    if result.status != "ok": ...
+"""
+
+import asyncio
+import collections
+import logging
+import os
+import signal
+import time
+from typing import List, NamedTuple, Optional, Sequence
+
+# --- CONFIGURATION ---
+SIM_MEMORY_BYTES = 512 << 20   # assumed peak memory of one simulator run
+TERMINATE_GRACE_SECONDS = 5.0  # SIGTERM -> SIGKILL delay when stopping a run
+OUTPUT_TAIL_LINES = 40         # output lines kept per run for failure reports
+# --- END CONFIGURATION ---
+
+class SimResult(NamedTuple):
+    """Outcome of one run.
+
+    status: "ok" (exit code 0), "failed" (non-zero exit code), "timeout"
+    (per-test timeout), "deadline" (global deadline reached before or during
+    the run) or "error" (could not be started). tail holds the last
+    OUTPUT_TAIL_LINES lines of stdout and stderr, interleaved as read.
+    """
+    status: str
+    returncode: Optional[int]
+    seconds: float
+    tail: List[str]
+    message: str = ""
+
+# ---- resource limits ----
+
+def available_memory_bytes() -> Optional[int]:
+    """MemAvailable from /proc/meminfo, else free physical pages; None if unknown."""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def concurrency_limit(requested: int = 0, memory_per_sim: int = SIM_MEMORY_BYTES) -> int:
+    """Simultaneous runs: `requested` (0 = CPU count), capped by available memory."""
+    limit = requested if requested > 0 else (os.cpu_count() or 1)
+    memory = available_memory_bytes()
+    if memory is not None and memory_per_sim > 0:
+        limit = min(limit, memory // memory_per_sim)
+    return max(1, limit)
+
+# ---- orchestration ----
+
+class SimOrchestrator:
+    """Runs commands concurrently under a shared limit, per-test timeout and global deadline."""
+
+    def __init__(self, max_concurrent: int = 0, per_test_timeout: Optional[float] = None,
+                 global_timeout: Optional[float] = None, memory_per_sim: int = SIM_MEMORY_BYTES,
+                 logger: logging.Logger = logging.getLogger()):
+        self.limit = concurrency_limit(max_concurrent, memory_per_sim)
+        self.per_test_timeout = per_test_timeout
+        self.deadline = None if global_timeout is None else time.monotonic() + global_timeout
+        self.logger = logger
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the global deadline (None without one)."""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    async def run(self, label: str, command: Sequence[str], cwd: Optional[str] = None,
+                  timeout: Optional[float] = None) -> SimResult:
+        """Run `command` once a slot is free; never raises except on cancellation."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.limit)
+        async with self._slots:
+            if self.expired():
+                return SimResult("deadline", None, 0.0, [], "session deadline reached before start")
+            return await self._run(label, command, cwd, timeout or self.per_test_timeout)
+
+    async def _run(self, label: str, command: Sequence[str], cwd: Optional[str],
+                   timeout: Optional[float]) -> SimResult:
+        remaining = self.remaining()
+        by_deadline = remaining is not None and (timeout is None or remaining < timeout)
+        budget = remaining if by_deadline else timeout
+        tail: "collections.deque[str]" = collections.deque(maxlen=OUTPUT_TAIL_LINES)
+        start = time.monotonic()
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *command, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                start_new_session=True)  # own process group: 'make' and its children stop together
+        except Exception as e:
+            return SimResult("error", None, time.monotonic() - start, [], f"could not start: {e}")
+
+        async def pump(stream: asyncio.StreamReader, name: str) -> None:
+            async for raw in stream:
+                line = raw.decode(errors="replace").rstrip()
+                tail.append(line)
+                self.logger.debug(f"[{label}] {name}: {line}")
+
+        io_and_exit = asyncio.gather(pump(proc.stdout, "out"), pump(proc.stderr, "err"), proc.wait())
+        try:
+            await asyncio.wait_for(io_and_exit, budget)
+        except asyncio.TimeoutError:
+            await self._stop(proc)
+            status = "deadline" if by_deadline else "timeout"
+            return SimResult(status, proc.returncode, time.monotonic() - start, list(tail),
+                             f"stopped after {budget:.1f}s ({'session deadline' if by_deadline else 'per-test timeout'})")
+        except asyncio.CancelledError:
+            await self._stop(proc)
+            raise
+        status = "ok" if proc.returncode == 0 else "failed"
+        return SimResult(status, proc.returncode, time.monotonic() - start, list(tail),
+                         "" if status == "ok" else f"exit code {proc.returncode}")
+
+    async def _stop(self, proc: asyncio.subprocess.Process) -> None:
+        """SIGTERM the run's process group, then SIGKILL whatever is left after the grace period
+        (also when the group leader has already exited but a child still holds the pipes)."""
+        self._signal(proc, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(asyncio.shield(proc.wait()), TERMINATE_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        self._signal(proc, getattr(signal, "SIGKILL", signal.SIGTERM))
+        await proc.wait()
+
+    @staticmethod
+    def _signal(proc: asyncio.subprocess.Process, sig: int) -> None:
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(proc.pid, sig)
+            elif proc.returncode is None:
+                proc.terminate()
+        except (ProcessLookupError, PermissionError):
+            pass
@@ -0,0 +1,167 @@
+"""
+stimulus_coverage.py
+
+Functional coverage model for the randomized regression (verification_script.py).
+
+Bins:
+- N       : 1-4 (the small-N RAW hazard), 5-15, 16-30, 31 (largest DUT model)
+- NxM     : size of B against the 1023-word limit; 960-1023 is "near full"
+- length  : sequence lengths T=1, 2-20, 21-100, >100 (a batch can hit several)
+- tie     : ACS / final-argmax decisions in the golden trellis: an exact tie,
+            a near tie (1..NEAR_TIE_ULPS apart; a batch can hit both) or
+            none within NEAR_TIE_ULPS
+- N x length : cross of the two, for short/long sequences on small/large models
+
+Batches are scored before they run from their planned parameters
+(`predict_bins`), so the directed generator can pick, among several candidate
+seeds, the one that fills the emptiest bins; the coverage actually reached is
+measured from the generated data (`measure_bins`) and reported at the end.
+"""
+
+import json
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+NEAR_TIE_ULPS = 4
+
+Bin = Tuple[str, str]  # (dimension, bin name)
+
+DIMENSIONS: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict([
+    ("N", ("1-4", "5-15", "16-30", "31")),
+    ("NxM", ("1-255", "256-767", "768-959", "960-1023")),
+    ("length", ("1", "2-20", "21-100", ">100")),
+    ("tie", ("exact", "near", "none")),
+])
+CROSSES = (("N", "length"),)
+# Sequences longer than 100 need (T + 1) * N <= 1024, i.e. N <= 9
+UNREACHABLE = {("Nxlength", "16-30|>100"), ("Nxlength", "31|>100")}
+
+# ---- binning ----
+
+def n_bin(N: int) -> str:
+    return "1-4" if N < 5 else "5-15" if N < 16 else "16-30" if N < 31 else "31"
+
+def product_bin(N: int, M: int) -> str:
+    p = N * M
+    return "1-255" if p < 256 else "256-767" if p < 768 else "768-959" if p < 960 else "960-1023"
+
+def length_bin(T: int) -> str:
+    return "1" if T == 1 else "2-20" if T <= 20 else "21-100" if T <= 100 else ">100"
+
+def length_bins_in_range(min_len: int, max_len: int) -> List[str]:
+    """Length bins a uniform draw from [min_len, max_len] can hit."""
+    edges = (("1", 1, 1), ("2-20", 2, 20), ("21-100", 21, 100), (">100", 101, 1 << 30))
+    return [name for name, lo, hi in edges if min_len <= hi and max_len >= lo]
+
+def with_crosses(bins: Iterable[Bin]) -> List[Bin]:
+    """Add the cross bins implied by a set of per-dimension bins."""
+    bins = list(dict.fromkeys(bins))
+    for a, b in CROSSES:
+        for _, va in (x for x in bins if x[0] == a):
+            for _, vb in (x for x in bins if x[0] == b):
+                bins.append((f"{a}x{b}", f"{va}|{vb}"))
+    return bins
+
+def predict_bins(N: int, M: int, min_len: int, max_len: int, ties: Optional[str]) -> List[Bin]:
+    """Bins a planned batch is expected to hit. Tie bins are a guess from its data:
+    ties=None (plain), "exact" (quantized) or "near" (quantized and ULP-jittered,
+    which keeps some exact ties)."""
+    bins = [("N", n_bin(N)), ("NxM", product_bin(N, M))]
+    bins += [("length", b) for b in length_bins_in_range(min_len, max_len)]
+    bins += [("tie", b) for b in {None: ("none",), "exact": ("exact",), "near": ("exact", "near")}[ties]]
+    return with_crosses(bins)
+
+# ---- measurement ----
+
+def _ordered_bits(v: np.ndarray) -> np.ndarray:
+    """float32 values mapped to integers whose difference is the ULP distance."""
+    bits = np.asarray(v, dtype=np.float32).view(np.int32).astype(np.int64)
+    return np.where(bits < 0, -(bits & 0x7FFFFFFF), bits)
+
+def decision_gaps(A_start: np.ndarray, A_trans: np.ndarray, B: np.ndarray,
+                  sequences: Sequence[np.ndarray]) -> np.ndarray:
+    """ULP gap between the best and second-best candidate of every max decision
+    (ACS or final argmax) in the float32 golden trellis; empty if N == 1."""
+    A_start = np.asarray(A_start, dtype=np.float32)
+    A_trans = np.asarray(A_trans, dtype=np.float32)
+    B = np.asarray(B, dtype=np.float32)
+    gaps = []
+    if A_start.size < 2:
+        return np.zeros(0, dtype=np.int64)
+    for seq in sequences:
+        if len(seq) == 0:
+            continue
+        oidx = np.asarray(seq, dtype=np.int64) - 1
+        V = A_start + B[:, oidx[0]]
+        for t in range(1, len(oidx)):
+            cand = V[:, None] + A_trans
+            top2 = -np.partition(-cand, 1, axis=0)[:2]
+            gaps.append(_ordered_bits(top2[0]) - _ordered_bits(top2[1]))
+            V = top2[0] + B[:, oidx[t]]
+        top2 = -np.partition(-V, 1)[:2]
+        gaps.append(np.atleast_1d(_ordered_bits(top2[0]) - _ordered_bits(top2[1])))
+    return np.concatenate(gaps) if gaps else np.zeros(0, dtype=np.int64)
+
+def tie_bins(gaps: np.ndarray) -> List[str]:
+    """Tie bins hit by a batch's decision gaps ("none" when no gap is within NEAR_TIE_ULPS)."""
+    bins = []
+    if (gaps == 0).any():
+        bins.append("exact")
+    if ((gaps > 0) & (gaps <= NEAR_TIE_ULPS)).any():
+        bins.append("near")
+    return bins or ["none"]
+
+def measure_bins(N: int, M: int, A_start, A_trans, B, sequences: Sequence[np.ndarray]) -> List[Bin]:
+    """Bins actually hit by a generated batch."""
+    bins = [("N", n_bin(N)), ("NxM", product_bin(N, M))]
+    bins += [("length", length_bin(len(s))) for s in sequences if len(s) > 0]
+    gaps = decision_gaps(A_start, A_trans, B, sequences)
+    if gaps.size:
+        bins += [("tie", b) for b in tie_bins(gaps)]
+    return with_crosses(bins)
+
+# ---- coverage model ----
+
+def all_bins() -> List[Bin]:
+    bins = [(dim, b) for dim, names in DIMENSIONS.items() for b in names]
+    for a, b in CROSSES:
+        bins += [(f"{a}x{b}", f"{va}|{vb}") for va in DIMENSIONS[a] for vb in DIMENSIONS[b]]
+    return [b for b in bins if b not in UNREACHABLE]
+
+class CoverageModel:
+    """Hit counts per bin."""
+
+    def __init__(self):
+        self.counts: "OrderedDict[Bin, int]" = OrderedDict((b, 0) for b in all_bins())
+
+    def add(self, bins: Iterable[Bin]) -> None:
+        for b in dict.fromkeys(bins):
+            if b in self.counts:
+                self.counts[b] += 1
+
+    def score(self, bins: Iterable[Bin]) -> float:
+        """Value of hitting `bins` now: empty bins count 1, others 1 / (1 + hits)."""
+        return sum(1.0 / (1 + self.counts[b]) for b in dict.fromkeys(bins) if b in self.counts)
+
+    def report(self) -> str:
+        """Per-dimension table of hit counts, plus the overall fraction of bins hit."""
+        lines = []
+        hit = sum(1 for c in self.counts.values() if c)
+        lines.append(f"Coverage: {hit}/{len(self.counts)} bins hit ({100.0 * hit / len(self.counts):.1f}%)")
+        dims = OrderedDict()
+        for (dim, b), c in self.counts.items():
+            dims.setdefault(dim, []).append((b, c))
+        for dim, entries in dims.items():
+            missing = [b for b, c in entries if not c]
+            cells = "  ".join(f"{b}:{c}" for b, c in entries if c)
+            lines.append(f"  {dim:<9} {cells}" + (f"  [missing: {', '.join(missing)}]" if missing else ""))
+        return "\n".join(lines)
+
+    def save(self, path: str) -> None:
+        data = OrderedDict()
+        for (dim, b), c in self.counts.items():
+            data.setdefault(dim, OrderedDict())[b] = c
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
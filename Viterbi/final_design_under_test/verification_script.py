@@ -1,9 +1,17 @@
 import subprocess
 import os
+import asyncio
 import datetime
 import logging
 import random
 import sys
+import argparse
+import contextlib
+import io
+import shutil
+import concurrent.futures
+import hashlib
+import time
 
 # --- CONFIGURATION (You MUST edit this section) ---
 
@@ -23,6 +31,28 @@ BSV_SIM_COMMAND = ["make", "b_sim"]
 # BSV_SIM_COMMAND = ["./bsv_simulation"]
 # --- END NEW ---
 
+# --- BUILD-ONCE SETTINGS ---
+# With BSV_BUILD_ONCE, the Bluesim executable is compiled once per session
+# ("make b_compile" in this directory) and BSV_SIM_BINARY is run directly for
+# every test, instead of BSV_SIM_COMMAND. The build is skipped entirely if
+# the hash of the .bsv sources matches the one stored next to the binary.
+BSV_BUILD_ONCE = True
+BSV_COMPILE_COMMAND = ["make", "b_compile"]
+BSV_COMPILE_TIMEOUT_SECONDS = 1800
+BSV_SIM_BINARY = os.path.join("intermediate", "mkfile_io_bsim")
+BSV_SIM_ARGS = ["-V"] # Same flags as 'make b_sim'
+# --- END BUILD-ONCE SETTINGS ---
+
+# --- PERFORMANCE COUNTERS ---
+# PERF_COUNTERS (or --perf) builds the simulator with SIMDEFINES=DUT_PERF into
+# PERF_BUILD_DIR, so every run also writes perf.csv (per-sequence cycle, stall
+# and FIFO occupancy counters). The per-sequence rows of all passing batches go
+# to PERF_ROWS_FILE and a summary by N and M (perf_report.py) ends the log.
+PERF_COUNTERS = False
+PERF_BUILD_DIR = "intermediate_perf"
+PERF_ROWS_FILE = "perf_sequences.csv"
+# --- END PERFORMANCE COUNTERS ---
+
 # --- NEW TIMEOUT SETTING ---
 # Set the maximum time (in seconds) to wait for the BSV sim to complete
 # before marking it as "timed out".
@@ -32,10 +62,24 @@ BSV_SIM_TIMEOUT_SECONDS = 300 # (Default is 5 minutes)
 
 # 3. Set the name of your Python interpreter
 PYTHON_INTERPRETER = "python" # or "python3"
+#    With GOLDEN_IN_PROCESS the golden model is called through its decode()
+#    API on the arrays just generated (no interpreter start-up, no .dat
+#    re-parsing); the interpreter is then only used with --golden-subprocess.
+GOLDEN_IN_PROCESS = True
+#    Tie-breaking of the golden model's argmax ("first" = np.argmax, "dut" =
+#    the DUT's unsigned bit-pattern comparator; see golden_viterbi._argbest).
+GOLDEN_TIE_BREAK = "dut"
 
 # 4. Define the script names
 #    We now import the generator, so this is only for the golden model
+import compare_outputs
 import generate_test_data
+import golden_viterbi
+import perf_report
+import phase_timing
+import results_store
+import sim_orchestrator
+import stimulus_coverage
 GOLDEN_MODEL_SCRIPT = "golden_viterbi.py"
 
 # 5. Define the output files
@@ -47,6 +91,51 @@ ACTUAL_OUTPUT_FILE = "output.dat"
 # 6. Log file name
 LOG_FILE = "verification.log"
 
+# 7. Parallel execution
+#    NUM_WORKERS = 1 runs every batch in the current directory, one after
+#    another (files are left behind for manual debugging).
+#    NUM_WORKERS > 1 (or --workers N) runs batches in a process pool, each in
+#    its own scratch directory under SCRATCH_ROOT. 0 means "all cores".
+NUM_WORKERS = 1
+SCRATCH_ROOT = "scratch"
+KEEP_PASSING_SCRATCH = False # Failing batches always keep their directory
+
+# 8. Results store
+#    Every batch's parameters, seed, DUT source hash, stimulus source hash and
+#    outcome go to this SQLite file as soon as it finishes. Batches that
+#    already passed with the same parameters, seed, DUT hash and stimulus hash
+#    are skipped (--rerun-passed runs them anyway); --resume continues the last
+#    interrupted session's batch plan. The stimulus hash covers
+#    STIMULUS_SOURCES: the scripts that turn a seed into test data, expected
+#    output and a pass/fail verdict (this script holds the stimulus profiles
+#    and the configuration above).
+RESULTS_DB = "results.sqlite"
+STIMULUS_SOURCES = ("verification_script.py", "generate_test_data.py", "stimulus_coverage.py",
+                    "golden_viterbi.py", "compare_outputs.py")
+
+# 9. Phase timing and profiling
+#    Every batch's phases (datagen, bins, golden, sim, compare; see
+#    phase_timing.py) are timed. The log ends with their median and p95, and
+#    PHASE_TIMINGS_FILE gets one row per batch. PROFILE (or --profile) also runs
+#    the Python phases under cProfile: per-batch .prof files go to PROFILE_DIR
+#    and are merged per phase into PROFILE_DIR/<phase>.prof and <phase>.txt.
+PHASE_TIMINGS_FILE = "phase_timings.csv"
+PROFILE = False
+PROFILE_DIR = "profiles"
+
+# 10. Asynchronous simulations
+#     ASYNC_SIMS (or --async-sims) runs the simulators from one asyncio event
+#     loop (sim_orchestrator.py) in scratch directories, like NUM_WORKERS > 1:
+#     up to MAX_CONCURRENT_SIMS at once (0 = CPU count, capped by free memory),
+#     with their output streamed into the log. A simulator exceeding
+#     BSV_SIM_TIMEOUT_SECONDS is stopped (SIGTERM, then SIGKILL) and its batch
+#     fails; at SESSION_DEADLINE_SECONDS (None = no deadline) the running
+#     simulators are stopped and no further batch starts, so the session can be
+#     continued with --resume.
+ASYNC_SIMS = False
+MAX_CONCURRENT_SIMS = 0
+SESSION_DEADLINE_SECONDS = None
+
 # --- RANDOM PARAMETER RANGES (Customize me) ---
 # 0 < N_STATES < 32  (1 to 31)
 MIN_N_STATES = 1
@@ -66,32 +155,58 @@ MAX_NUM_SEQ = 9
 # Constants
 MIN_SEQ_LEN = 1
 MAX_SEQ_LEN = 20
+
+# Seeding: each batch's parameters and data come from its own 64-bit seed,
+# derived from the session seed and the test number. None draws a fresh
+# session seed (logged); pass --seed S to repeat a session, or
+# --replay TEST_SEED to rerun a single batch.
+SESSION_SEED = None
+
+# Coverage-directed stimulus (stimulus_coverage.py). A batch's stimulus
+# profile (sequence lengths; plain, exact-tie or near-tie A/B) follows from its seed,
+# like N, M and Num_Seq. With COVERAGE_DIRECTED each test picks, among
+# COVERAGE_CANDIDATES candidate seeds, the one whose planned parameters fill
+# the emptiest coverage bins (--uniform: always the first candidate). The
+# coverage actually reached is logged at the end and saved to COVERAGE_FILE.
+COVERAGE_DIRECTED = True
+COVERAGE_CANDIDATES = 16
+COVERAGE_FILE = "coverage.json"
+STIMULUS_PROFILES = (("default", 0.55), ("single", 0.15), ("short", 0.1), ("long", 0.2))
+TIE_PROBABILITY = 0.25
+TIE_LEVELS = 2 # tie-prone data: A and B rounded to multiples of 1/TIE_LEVELS
+NEAR_TIE_PROBABILITY = 0.15
+NEAR_TIE_JITTER_ULPS = 3 # near-tie data: tie-prone data, each entry moved 0..NEAR_TIE_JITTER_ULPS ULPs
 # --- End of Configuration ---
 
 
-# Setup logging
-# ... (logging setup code is unchanged) ...
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filemode='w'  # 'w' = overwrite log each run
-)
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-formatter = logging.Formatter('%(message)s')
-console.setFormatter(formatter)
-logging.getLogger('').addHandler(console)
-
-def run_script(script_name, interpreter):
-# ... (this function is unchanged) ...
+# Directory holding this script, the golden model, the Makefile and the .bsv sources
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def setup_logging(append=False, filename=None):
+    """Configures the log file and console output (called from main, not at import,
+    so worker processes importing this module do not truncate the log)."""
+    logging.basicConfig(
+        filename=filename or LOG_FILE,
+        level=logging.DEBUG,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        filemode='a' if append else 'w'  # 'w' = overwrite log each run; resumed sessions append
+    )
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    formatter = logging.Formatter('%(message)s')
+    console.setFormatter(formatter)
+    logging.getLogger('').addHandler(console)
+
+def run_script(script_name, interpreter, cwd=None, args=()):
     """Runs a Python script as a subprocess and checks for errors."""
     try:
-        command = [interpreter, script_name]
+        command = [interpreter, script_name, *args]
         result = subprocess.run(command, 
                                 capture_output=True, 
                                 text=True, 
-                                timeout=30)
+                                timeout=30,
+                                cwd=cwd)
                                 
         if result.returncode != 0:
             logging.error(f"Script '{script_name}' FAILED")
@@ -106,15 +221,87 @@ def run_script(script_name, interpreter):
         logging.error(f"Failed to run script '{script_name}': {e}")
         return False
 
-def run_bsv_simulation():
-# ... (this function is unchanged) ...
-    command = BSV_SIM_COMMAND # <-- New
+def sources_hash(names):
+    """SHA-256 over the names and contents of the given files next to this script."""
+    h = hashlib.sha256()
+    for name in sorted(names):
+        h.update(name.encode())
+        with open(os.path.join(SCRIPT_DIR, name), 'rb') as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
+
+def bsv_sources_hash():
+    """Hash of every .bsv source next to this script (the DUT)."""
+    return sources_hash(n for n in os.listdir(SCRIPT_DIR) if n.endswith(".bsv"))
+
+def stimulus_sources_hash():
+    """Hash of STIMULUS_SOURCES: what a batch seed's data, expected output and verdict depend on."""
+    return sources_hash(STIMULUS_SOURCES)
+
+def perf_make_args():
+    """Extra make variables selecting the DUT_PERF build (empty without PERF_COUNTERS)."""
+    if not PERF_COUNTERS:
+        return []
+    return ["SIMDEFINES=DUT_PERF", f"BUILDDIR={PERF_BUILD_DIR}/"]
+
+def bsv_sim_binary():
+    """Path of the prebuilt simulator (the DUT_PERF build lives in its own build directory)."""
+    if PERF_COUNTERS:
+        return os.path.join(SCRIPT_DIR, PERF_BUILD_DIR, os.path.basename(BSV_SIM_BINARY))
+    return os.path.join(SCRIPT_DIR, BSV_SIM_BINARY)
+
+def ensure_simulator_built(force=False):
+    """
+    Compiles the Bluesim executable unless it is up to date with the .bsv sources.
+    Returns (ok, compile_seconds); compile_seconds is 0.0 when the build was reused.
+    """
+    binary = bsv_sim_binary()
+    compile_command = BSV_COMPILE_COMMAND + perf_make_args()
+    stamp = binary + ".srchash"
+    src_hash = bsv_sources_hash()
+    if not force and os.path.exists(binary) and os.path.exists(stamp):
+        with open(stamp, 'r') as f:
+            if f.read().strip() == src_hash:
+                logging.info(f"Simulator up to date ({src_hash[:12]}), skipping compile.")
+                return True, 0.0
+
+    logging.info(f"Compiling simulator: {' '.join(compile_command)}")
+    start = time.perf_counter()
+    try:
+        result = subprocess.run(compile_command,
+                                capture_output=True,
+                                text=True,
+                                timeout=BSV_COMPILE_TIMEOUT_SECONDS,
+                                cwd=SCRIPT_DIR)
+    except Exception as e:
+        logging.error(f"Simulator compile '{' '.join(compile_command)}' failed: {e}")
+        return False, time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0 or not os.path.exists(binary):
+        logging.error(f"Simulator compile '{' '.join(compile_command)}' FAILED")
+        logging.error(f"Stdout: {result.stdout}")
+        logging.error(f"Stderr: {result.stderr}")
+        return False, elapsed
+    with open(stamp, 'w') as f:
+        f.write(src_hash + "\n")
+    logging.info(f"Simulator compiled in {elapsed:.2f}s")
+    return True, elapsed
+
+def bsv_sim_command():
+    """The per-test simulation command: the prebuilt binary, or BSV_SIM_COMMAND."""
+    if BSV_BUILD_ONCE:
+        return [bsv_sim_binary()] + BSV_SIM_ARGS
+    return BSV_SIM_COMMAND + perf_make_args()
+
+def run_bsv_simulation(cwd=None):
+    command = bsv_sim_command()
     
     try:
         result = subprocess.run(command, 
                                 capture_output=True, 
                                 text=True, 
-                                timeout=BSV_SIM_TIMEOUT_SECONDS) # 60-second timeout <-- MODIFIED
+                                timeout=BSV_SIM_TIMEOUT_SECONDS, # 60-second timeout <-- MODIFIED
+                                cwd=cwd)
                                 
         if result.returncode != 0:
             # logging.error(f"BSV Sim '{BSV_SIM_EXECUTABLE}' FAILED (crashed)") <-- Old
@@ -122,7 +309,7 @@ def run_bsv_simulation():
             logging.error(f"Stderr: {result.stderr}")
             return False
         
-        if not os.path.exists(ACTUAL_OUTPUT_FILE):
+        if not os.path.exists(os.path.join(cwd or ".", ACTUAL_OUTPUT_FILE)):
             # logging.error(f"BSV Sim '{BSV_SIM_EXECUTABLE}' FAILED (did not create {ACTUAL_OUTPUT_FILE})") <-- Old
             logging.error(f"BSV Sim command '{' '.join(command)}' FAILED (did not create {ACTUAL_OUTPUT_FILE})") # <-- New
             return False
@@ -144,26 +331,35 @@ def run_bsv_simulation():
         logging.error(f"BSV Sim command '{' '.join(command)}' failed: {e}") # <-- New
         return False
 
-def compare_output_files():
-# ... (this function is unchanged) ...
+def run_golden_in_process(data, cwd=None):
+    """Decodes generated test data with golden_viterbi.decode and writes EXPECTED_OUTPUT_FILE."""
+    try:
+        sequences = golden_viterbi.split_sequences(data["input_words"])
+        outputs = golden_viterbi.decode(data["N"], data["M"], data["A_start"],
+                                        data["A_trans"], data["B"], sequences,
+                                        tie_break=GOLDEN_TIE_BREAK)
+        golden_viterbi.write_output_file(os.path.join(cwd or ".", EXPECTED_OUTPUT_FILE), outputs)
+        logging.debug(f"Golden model decoded {len(outputs)} sequences in-process.")
+        return True
+    except Exception as e:
+        logging.error(f"Golden model (in-process) failed: {e}")
+        return False
+
+def compare_output_files(cwd=None):
     """
-    Compares the expected and actual output files.
-    Returns True on match, False on mismatch or error.
+    Compares the expected and actual output files record by record (streaming).
+    Returns True on match, False on mismatch or error; a mismatch logs only
+    the first differing sequence, time step and log-prob ULP distance.
     """
     try:
-        with open(EXPECTED_OUTPUT_FILE, 'r') as f:
-            expected_content = f.read().strip()
-            
-        with open(ACTUAL_OUTPUT_FILE, 'r') as f:
-            actual_content = f.read().strip()
-            
-        if expected_content == actual_content:
+        divergence = compare_outputs.compare_files(os.path.join(cwd or ".", EXPECTED_OUTPUT_FILE),
+                                                   os.path.join(cwd or ".", ACTUAL_OUTPUT_FILE))
+        if divergence is None:
             logging.debug("Output files match.")
             return True
         else:
             logging.error("!!! OUTPUT MISMATCH !!!")
-            logging.error(f"Expected:\n{expected_content}")
-            logging.error(f"Actual:\n{actual_content}")
+            logging.error(f"First divergence: {compare_outputs.describe(divergence)}")
             return False
             
     except FileNotFoundError as e:
@@ -173,13 +369,14 @@ def compare_output_files():
         logging.error(f"Error during file comparison: {e}")
         return False
 
-def generate_constrained_parameters():
+def generate_constrained_parameters(rng=random):
     """
     Generates random N, M, and Num_Sequences that
-    respect the defined constraints.
+    respect the defined constraints, drawing from `rng`
+    (a random.Random, or the global random module).
     """
     # Pick N first
-    N = random.randint(MIN_N_STATES, MAX_N_STATES)
+    N = rng.randint(MIN_N_STATES, MAX_N_STATES)
     
     # Now calculate valid range for M
     # M must be <= MAX_M_OBS
@@ -192,74 +389,535 @@ def generate_constrained_parameters():
         # In our case, MIN_M_OBS=1, so this check is just a safeguard.
         logging.warning(f"Could not find valid M for N={N}. Retrying.")
         # We'll just pick a new N
-        N = random.randint(MIN_N_STATES, max(MIN_N_STATES, MAX_PRODUCT // MIN_M_OBS))
+        N = rng.randint(MIN_N_STATES, max(MIN_N_STATES, MAX_PRODUCT // MIN_M_OBS))
         max_m_allowed = min(MAX_M_OBS, MAX_PRODUCT // N)
         
-    M = random.randint(MIN_M_OBS, max_m_allowed)
+    M = rng.randint(MIN_M_OBS, max_m_allowed)
     
     # Pick number of sequences
-    Num_Seq = random.randint(MIN_NUM_SEQ, MAX_NUM_SEQ)
+    Num_Seq = rng.randint(MIN_NUM_SEQ, MAX_NUM_SEQ)
     
     return N, M, Num_Seq
+
+def derive_test_seed(session_seed, test_num):
+    """64-bit seed of one batch, derived from the session seed and test number."""
+    digest = hashlib.sha256(f"{session_seed}:{test_num}".encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+def plan_batch(test_num, test_seed):
+    """(test_num, N, M, Num_Seq, seed) of a batch; everything follows from test_seed."""
+    N, M, Num_Seq = generate_constrained_parameters(random.Random(test_seed))
+    return test_num, N, M, Num_Seq, test_seed
+
+def max_dut_seq_len(N, Num_Seq):
+    """Longest sequence length that keeps a batch within the testbench limits
+    (1024 input.dat words, 10-bit timeS, (T + 1) * N <= 1024 workMem words)."""
+    return max(1, min(1023, 1024 // N - 1, 1023 // Num_Seq - 1))
+
+def stimulus_profile(N, Num_Seq, seed):
+    """(min_len, max_len, ties) of a batch, drawn from STIMULUS_PROFILES by its seed;
+    ties is None (plain data), "exact" (TIE_LEVELS) or "near" (also NEAR_TIE_JITTER_ULPS)."""
+    rng = random.Random(f"profile:{seed}")
+    name = rng.choices([p for p, _ in STIMULUS_PROFILES], weights=[w for _, w in STIMULUS_PROFILES])[0]
+    draw = rng.random()
+    ties = ("exact" if draw < TIE_PROBABILITY else
+            "near" if draw < TIE_PROBABILITY + NEAR_TIE_PROBABILITY else None)
+    longest = max_dut_seq_len(N, Num_Seq)
+    if name == "single":
+        return 1, 1, ties
+    if name == "short":
+        return 1, min(3, longest), ties
+    if name == "long" and longest > MAX_SEQ_LEN:
+        return MAX_SEQ_LEN + 1, longest, ties
+    return MIN_SEQ_LEN, min(MAX_SEQ_LEN, longest), ties
+
+def predicted_bins(batch):
+    _, N, M, Num_Seq, seed = batch
+    min_len, max_len, ties = stimulus_profile(N, Num_Seq, seed)
+    return stimulus_coverage.predict_bins(N, M, min_len, max_len, ties)
+
+def choose_batch(test_num, session_seed, planned):
+    """Directed pick: the candidate batch whose predicted bins score highest
+    against the coverage planned so far (first candidate on ties)."""
+    best, best_score = None, -1.0
+    for k in range(COVERAGE_CANDIDATES):
+        key = test_num if k == 0 else f"{test_num}.{k}"
+        batch = plan_batch(test_num, derive_test_seed(session_seed, key))
+        score = planned.score(predicted_bins(batch))
+        if score > best_score:
+            best, best_score = batch, score
+    return best
     
-def main():
+# --- Per-batch pipeline ---
+# Outcome of a batch: (summary shown in the log, passed?, stop the session?)
+OUTCOMES = {
+    "passed":   ("PASSED", True, False),
+    "datagen":  ("FAILED (Data Generation)", False, True),
+    "golden":   ("FAILED (Golden Model Run)", False, True),
+    "sim":      ("FAILED (BSV Simulation Run)", False, False),
+    "mismatch": ("FAILED (Output Mismatch)", False, False),
+}
+
+def prepare_scratch_dir(workdir):
+    """Creates a per-batch directory with links to the Makefile and .bsv sources,
+    so 'make b_sim' and the simulator's relative .dat paths resolve inside it."""
+    os.makedirs(workdir, exist_ok=True)
+    for name in os.listdir(SCRIPT_DIR):
+        if name == "Makefile" or name.endswith(".bsv"):
+            dst = os.path.join(workdir, name)
+            if os.path.lexists(dst):
+                continue
+            try:
+                os.symlink(os.path.join(SCRIPT_DIR, name), dst)
+            except OSError:
+                shutil.copy2(os.path.join(SCRIPT_DIR, name), dst)
+
+def profile_prefix(label):
+    """Path prefix of a batch's .prof files, or None when not profiling."""
+    return os.path.join(os.path.abspath(PROFILE_DIR), label) if PROFILE else None
+
+def run_test_batch(N, M, Num_Seq, seed, workdir=None, profile_prefix=None):
+    """
+    Runs generate -> golden model -> BSV sim -> compare for one batch,
+    in `workdir` (or the current directory).
+    Returns (OUTCOMES key, {phase: seconds}) with the phase_timing.PHASES it
+    reached; the coverage bins the generated data hit are under "coverage",
+    and with PERF_COUNTERS a passing batch also carries its per-sequence
+    counter rows under "perf". With `profile_prefix` the Python phases are
+    profiled into '<profile_prefix>_<phase>.prof'.
+    """
+    timings = {}
+    timer = phase_timing.PhaseTimer(timings, profile_prefix)
+    outcome = prepare_batch(N, M, Num_Seq, seed, workdir, timer)
+    if outcome:
+        return outcome, timings
+
+    # 3. Run BSV simulation
+    with timer.phase("sim", profile=False):
+        sim_ok = run_bsv_simulation(cwd=workdir)
+    logging.debug(f"BSV Sim run time: {timings['sim']:.2f}s")
+    if not sim_ok:
+        return "sim", timings
+    return check_batch(workdir, timer), timings
+
+def prepare_batch(N, M, Num_Seq, seed, workdir, timer):
+    """Steps 1-2 of a batch (test data, coverage bins, golden model) in `workdir`;
+    returns the failing OUTCOMES key, or None when the simulator can run."""
+    timings = timer.timings
+    min_len, max_len, ties = stimulus_profile(N, Num_Seq, seed)
+    # 1. Generate test data files using the module
+    try:
+        cwd = os.getcwd()
+        if workdir:
+            os.chdir(workdir)
+        try:
+            with timer.phase("datagen"):
+                data = generate_test_data.generate_all_test_data(
+                    N, M, Num_Seq, min_len, max_len, seed=seed,
+                    tie_levels=TIE_LEVELS if ties else None,
+                    tie_ulps=NEAR_TIE_JITTER_ULPS if ties == "near" else 0
+                )
+        finally:
+            os.chdir(cwd)
+        logging.debug(f"Test data files generated (lengths {min_len}-{max_len}"
+                      f"{f', {ties} ties' if ties else ''}).")
+    except Exception as e:
+        logging.error(f"generate_test_data.py failed: {e}")
+        return "datagen"
+    with timer.phase("bins"):
+        timings["coverage"] = stimulus_coverage.measure_bins(
+            N, M, data["A_start"], data["A_trans"], data["B"],
+            golden_viterbi.split_sequences(data["input_words"]))
+
+    # 2. Run golden model (in-process, or as a script)
+    with timer.phase("golden", profile=GOLDEN_IN_PROCESS):
+        if GOLDEN_IN_PROCESS:
+            golden_ok = run_golden_in_process(data, cwd=workdir)
+        else:
+            golden_ok = run_script(os.path.join(SCRIPT_DIR, GOLDEN_MODEL_SCRIPT),
+                                   PYTHON_INTERPRETER, cwd=workdir,
+                                   args=("--tie-break", GOLDEN_TIE_BREAK))
+    if not golden_ok:
+        return "golden"
+    return None
+
+def check_batch(workdir, timer):
+    """Step 4 of a batch: compare the outputs (and read the perf counters); returns the OUTCOMES key."""
+    with timer.phase("compare"):
+        outputs_match = compare_output_files(cwd=workdir)
+    if not outputs_match:
+        return "mismatch"
+    if PERF_COUNTERS:
+        try:
+            timer.timings["perf"] = perf_report.analyze_run(workdir or ".")
+        except Exception as e:
+            logging.warning(f"Could not read performance counters: {e}")
+    return "passed"
+
+async def run_test_batch_async(orchestrator, test_num, N, M, Num_Seq, seed, workdir,
+                               profile_prefix=None):
+    """
+    run_test_batch with the simulator run on `orchestrator` (sim_orchestrator):
+    its output is streamed into the log and it is stopped at the per-test
+    timeout or the session deadline. The Python phases run in the event loop
+    thread (generate_all_test_data changes directory, so they are never run
+    concurrently). Returns (OUTCOMES key or "deadline", timings).
+    """
+    timings = {}
+    timer = phase_timing.PhaseTimer(timings, profile_prefix)
+    outcome = prepare_batch(N, M, Num_Seq, seed, workdir, timer)
+    if outcome:
+        return outcome, timings
+
+    command = bsv_sim_command()
+    result = await orchestrator.run(f"test {test_num:04d}", command, cwd=workdir,
+                                    timeout=BSV_SIM_TIMEOUT_SECONDS)
+    timings["sim"] = result.seconds
+    logging.debug(f"[test {test_num:04d}] BSV Sim run time: {result.seconds:.2f}s")
+    if result.status == "deadline":
+        return "deadline", timings
+    if result.status != "ok" or not os.path.exists(os.path.join(workdir, ACTUAL_OUTPUT_FILE)):
+        reason = result.message or f"did not create {ACTUAL_OUTPUT_FILE}"
+        logging.error(f"[test {test_num:04d}] BSV Sim command '{' '.join(command)}' FAILED ({reason})")
+        for line in result.tail:
+            logging.error(f"[test {test_num:04d}]   {line}")
+        return "sim", timings
+    return check_batch(workdir, timer), timings
+
+def replay_batch(test_seed, workdir="."):
+    """
+    Regenerates one batch from its logged seed and reruns it in `workdir`
+    (created if needed; the .dat files are kept). Returns (batch, outcome, timings).
+    """
+    batch = plan_batch(0, test_seed)
+    _, N, M, Num_Seq, seed = batch
+    logging.info(f"--- Replaying batch with seed {seed} in {os.path.abspath(workdir)} ---")
+    logging.info(f"Parameters: N={N}, M={M}, Num_Sequences={Num_Seq}")
+    if os.path.abspath(workdir) != os.getcwd():
+        prepare_scratch_dir(workdir)
+    outcome, timings = run_test_batch(N, M, Num_Seq, seed, None if workdir == "." else workdir,
+                                      profile_prefix(f"replay_{seed}"))
+    logging.info(f"Replay: {OUTCOMES[outcome][0]}")
+    return batch, outcome, timings
+
+class _RecordCollector(logging.Handler):
+    """Buffers log records in a worker so the parent can replay them in test order."""
+    def __init__(self):
+        super().__init__(level=logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((record.levelno, record.getMessage()))
+
+_collector = None
+# Settings main() changes from the command line. Workers get them through
+# _init_worker: under the spawn/forkserver start methods they re-import this
+# module and would otherwise see the defaults.
+_WORKER_SETTINGS = ("BSV_BUILD_ONCE", "GOLDEN_IN_PROCESS", "PERF_COUNTERS", "PROFILE")
+
+def worker_settings():
+    return {name: globals()[name] for name in _WORKER_SETTINGS}
+
+def _init_worker(settings):
+    global _collector
+    globals().update(settings)
+    _collector = _RecordCollector()
+    root = logging.getLogger('')
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_collector)
+    root.setLevel(logging.DEBUG)
+
+def _run_test_in_worker(N, M, Num_Seq, seed, workdir, prof_prefix=None):
+    """Process-pool entry point: runs one batch, returns (outcome, timings, log records)."""
+    _collector.records = []
+    prepare_scratch_dir(workdir)
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        outcome, timings = run_test_batch(N, M, Num_Seq, seed, workdir, prof_prefix)
+    if stdout.getvalue():
+        logging.debug(stdout.getvalue().rstrip())
+    if outcome == "passed" and not KEEP_PASSING_SCRATCH:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return outcome, timings, _collector.records
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Randomized BSV vs golden-model regression")
+    ap.add_argument("--tests", type=int, default=NUM_TESTS, help="number of batch tests")
+    ap.add_argument("--workers", type=int, default=NUM_WORKERS,
+                    help="parallel batches (1 = serial in the current directory, 0 = all cores)")
+    ap.add_argument("--rebuild", action="store_true",
+                    help="recompile the simulator even if the .bsv sources are unchanged")
+    ap.add_argument("--golden-subprocess", action="store_true",
+                    help="run golden_viterbi.py as a separate script instead of calling decode()")
+    ap.add_argument("--make-per-test", action="store_true",
+                    help="run BSV_SIM_COMMAND (make b_sim) for every test instead of building once")
+    ap.add_argument("--perf", action="store_true",
+                    help="use the DUT_PERF simulator build and summarize its cycle/stall counters")
+    ap.add_argument("--profile", action="store_true",
+                    help=f"also profile the Python phases with cProfile (merged into {PROFILE_DIR}/)")
+    ap.add_argument("--async-sims", action="store_true", default=ASYNC_SIMS,
+                    help="run the simulators concurrently from an asyncio event loop")
+    ap.add_argument("--max-sims", type=int, default=MAX_CONCURRENT_SIMS, metavar="K",
+                    help="simultaneous simulators with --async-sims (0 = CPU count, memory permitting)")
+    ap.add_argument("--deadline", type=float, default=SESSION_DEADLINE_SECONDS, metavar="SECONDS",
+                    help="with --async-sims, stop the session after this many seconds")
+    ap.add_argument("--resume", type=int, nargs="?", const=-1, default=None, metavar="SESSION",
+                    help=f"continue an interrupted session from {RESULTS_DB} (default: the last unfinished one)")
+    ap.add_argument("--rerun-passed", action="store_true",
+                    help="also run batches that already passed with the current DUT sources")
+    ap.add_argument("--no-results-db", action="store_true",
+                    help=f"do not read or write {RESULTS_DB}")
+    ap.add_argument("--seed", type=int, default=SESSION_SEED,
+                    help="session seed (per-batch seeds are derived from it); default: a fresh one")
+    ap.add_argument("--uniform", action="store_true",
+                    help="plan batches uniformly at random instead of coverage-directed")
+    ap.add_argument("--replay", type=int, default=None, metavar="TEST_SEED",
+                    help="regenerate and rerun only the batch logged with this seed")
+    ap.add_argument("--replay-dir", default=None,
+                    help="directory for --replay (default: replay_<seed>; '.' = current directory)")
+    args = ap.parse_args(argv)
+    if args.resume is not None and args.no_results_db:
+        ap.error("--resume needs the results database")
+    if args.deadline is not None and not args.async_sims:
+        ap.error("--deadline needs --async-sims")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    num_tests = args.tests
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    replay_log = None if args.replay is None else f"replay_{args.replay}.log"
+    setup_logging(append=args.resume is not None, filename=replay_log)
+
     logging.info(f"--- Verification Run Started ---")
-    # ... (logging info unchanged) ...
     logging.info(f"Timestamp: {datetime.datetime.now()}")
-    logging.info(f"Total Batch Tests: {NUM_TESTS}")
     # logging.info(f"BSV Executable: {BSV_SIM_EXECUTABLE}") <-- Old
-    logging.info(f"BSV Sim Command: {' '.join(BSV_SIM_COMMAND)}") # <-- New
+    global BSV_BUILD_ONCE, GOLDEN_IN_PROCESS, PERF_COUNTERS, PROFILE
+    if args.perf:
+        PERF_COUNTERS = True
+    if args.profile:
+        PROFILE = True
+    if PROFILE:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+    if args.make_per_test:
+        BSV_BUILD_ONCE = False
+    if args.golden_subprocess:
+        GOLDEN_IN_PROCESS = False
+    logging.info(f"BSV Sim Command: {' '.join(bsv_sim_command())}") # <-- New
+    if args.async_sims:
+        orchestrator = sim_orchestrator.SimOrchestrator(args.max_sims, BSV_SIM_TIMEOUT_SECONDS,
+                                                        args.deadline)
+        logging.info(f"Asynchronous simulations: up to {orchestrator.limit} at once"
+                     + (f", session deadline {args.deadline:g}s" if args.deadline is not None else ""))
+    else:
+        logging.info(f"Workers: {workers}")
+
+    compile_seconds = 0.0
+    if BSV_BUILD_ONCE:
+        built, compile_seconds = ensure_simulator_built(force=args.rebuild)
+        if not built:
+            logging.info("Stopping run: simulator could not be compiled.")
+            return 1 if args.replay is not None else None
     logging.info("="*50 + "\n")
+
+    store = None if args.no_results_db else results_store.ResultsStore(RESULTS_DB)
+    dut_hash = bsv_sources_hash()
+    stim_hash = stimulus_sources_hash()
+
+    if args.replay is not None:
+        batch, outcome, timings = replay_batch(args.replay, args.replay_dir or f"replay_{args.replay}")
+        if store:
+            store.record(dut_hash, stim_hash, batch, outcome, timings.get("sim"))
+            store.close()
+        logging.info(f"Full log available at: {replay_log}")
+        return 0 if OUTCOMES[outcome][1] else 1
     
     passed_count = 0
+    skipped_count = 0
     total_run_actual = 0
-    
-    for i in range(NUM_TESTS):
-        test_num = i + 1
-        total_run_actual = test_num
-        logging.info(f"--- Running Test Batch {test_num}/{NUM_TESTS} ---")
-        
-        # 1. Generate random parameters for this run
-        try:
-            N, M, Num_Seq = generate_constrained_parameters()
-            logging.info(f"Parameters: N={N}, M={M}, Num_Sequences={Num_Seq}")
-        except Exception as e:
-            logging.error(f"Failed to generate parameters: {e}")
-            logging.info(f"Test {test_num}/{NUM_TESTS}: FAILED (Parameter Generation)\n")
-            break # Critical failure
-            
-        # 2. Generate test data files using the module
-        try:
-            generate_test_data.generate_all_test_data(
-                N, M, Num_Seq, MIN_SEQ_LEN, MAX_SEQ_LEN
-            )
-            logging.debug("Test data files generated.")
-        except Exception as e:
-            logging.error(f"generate_test_data.py failed: {e}")
-            logging.info(f"Test {test_num}/{NUM_TESTS}: FAILED (Data Generation)")
-            logging.info("Stopping run due to error.\n")
-            break # Critical failure
-        
-        # 3. Run golden model (as a script)
-        if not run_script(GOLDEN_MODEL_SCRIPT, PYTHON_INTERPRETER):
-            logging.info(f"Test {test_num}/{NUM_TESTS}: FAILED (Golden Model Run)")
+    phase_rows = []
+    perf_rows = []
+    session_id = None
+    planned = stimulus_coverage.CoverageModel()
+    measured = stimulus_coverage.CoverageModel()
+    directed = COVERAGE_DIRECTED and not args.uniform
+
+    # 1. Derive every batch's seed from the session seed and plan its
+    #    parameters up front, in the parent, so the session is the same serial
+    #    or parallel. A resumed session reuses the stored plan instead.
+    batches = []
+    if args.resume is not None:
+        session_id = store.last_unfinished_session() if args.resume < 0 else args.resume
+        batches = store.session_batches(session_id) if session_id is not None else []
+        if not batches:
+            logging.info(f"No session to resume in {RESULTS_DB}.")
+            store.close()
+            return
+        num_tests = len(batches)
+        logging.info(f"Resuming session {session_id} from {RESULTS_DB}")
+    else:
+        session_seed = args.seed if args.seed is not None else random.getrandbits(64)
+        logging.info(f"Session seed: {session_seed} (repeat this session with --seed {session_seed})")
+        for i in range(num_tests):
+            try:
+                if directed:
+                    batch = choose_batch(i + 1, session_seed, planned)
+                else:
+                    batch = plan_batch(i + 1, derive_test_seed(session_seed, i + 1))
+                planned.add(predicted_bins(batch))
+                batches.append(batch)
+            except Exception as e:
+                logging.error(f"Failed to generate parameters: {e}")
+                logging.info(f"Test {i + 1}/{num_tests}: FAILED (Parameter Generation)\n")
+                break # Critical failure
+        if store:
+            session_id = store.create_session(dut_hash, batches)
+    logging.info(f"Total Batch Tests: {num_tests}")
+    logging.info(f"DUT source hash: {dut_hash[:12]}, stimulus source hash: {stim_hash[:12]}"
+                 + (f", session {session_id}" if session_id else ""))
+    done = store.passed_keys(dut_hash, stim_hash) if store and not args.rerun_passed else set()
+    stopped = False
+
+    def report(batch, outcome, timings):
+        test_num = batch[0]
+        summary, passed, critical = OUTCOMES[outcome]
+        logging.info(f"Test {test_num}/{num_tests}: {summary}")
+        if not passed:
+            logging.info(f"Replay with: python verification_script.py --replay {batch[4]}")
+        if critical:
             logging.info("Stopping run due to error.\n")
-            break # Critical failure
-            
-        # 4. Run BSV simulation
-        if not run_bsv_simulation():
-            logging.info(f"Test {test_num}/{NUM_TESTS}: FAILED (BSV Simulation Run)")
+        elif outcome == "sim":
             logging.info("See log for crash details.\n")
-            continue # Non-critical, try next test
-            
-        # 5. Compare outputs
-        if compare_output_files():
-            passed_count += 1
-            logging.info(f"Test {test_num}/{NUM_TESTS}: PASSED\n")
         else:
-            logging.info(f"Test {test_num}/{NUM_TESTS}: FAILED (Output Mismatch)\n")
-        
+            logging.info("")
         logging.debug("-"*50)
+        if store:
+            store.record(dut_hash, stim_hash, batch, outcome, timings.get("sim"), session_id)
+        phase_rows.append(phase_timing.batch_row(batch, outcome, timings))
+        return passed, critical
+
+    def skip(batch):
+        """Logs a batch that already passed with this DUT hash and seed; True if skipped."""
+        test_num, N, M, Num_Seq, seed = batch
+        if (N, M, Num_Seq, seed) not in done:
+            return False
+        logging.info(f"Test {test_num}/{num_tests}: SKIPPED (passed before, N={N}, M={M}, "
+                     f"Num_Sequences={Num_Seq}, seed={seed})")
+        return True
+
+    async def run_async():
+        """Keeps up to 2x the simulator limit of batches in flight (so the next
+        batch's data is ready when a simulator slot frees up); reports them as
+        they finish."""
+        nonlocal passed_count, skipped_count, total_run_actual, stopped
+        pending = {}
+        queue = iter(batches)
+        while True:
+            while len(pending) < 2 * orchestrator.limit and not stopped:
+                batch = next(queue, None)
+                if batch is None:
+                    break
+                if orchestrator.expired():
+                    logging.info("Session deadline reached: no further batches started.")
+                    stopped = True
+                    break
+                test_num, N, M, Num_Seq, seed = batch
+                if skip(batch):
+                    skipped_count += 1
+                    continue
+                workdir = os.path.abspath(os.path.join(SCRATCH_ROOT, f"test_{test_num:04d}"))
+                prepare_scratch_dir(workdir)
+                logging.info(f"--- Running Test Batch {test_num}/{num_tests} ---")
+                logging.info(f"Parameters: N={N}, M={M}, Num_Sequences={Num_Seq}, Seed={seed}")
+                task = asyncio.ensure_future(run_test_batch_async(
+                    orchestrator, test_num, N, M, Num_Seq, seed, workdir,
+                    profile_prefix(f"test_{test_num:04d}")))
+                pending[task] = (batch, workdir)
+            if not pending:
+                return
+            finished, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                batch, workdir = pending.pop(task)
+                try:
+                    outcome, timings = task.result()
+                except Exception as e:
+                    logging.error(f"Test {batch[0]} raised: {e}")
+                    outcome, timings = "sim", {}
+                if outcome == "deadline":
+                    logging.info(f"Test {batch[0]}/{num_tests}: STOPPED (session deadline)\n")
+                    stopped = True
+                    continue
+                total_run_actual += 1
+                passed, critical = report(batch, outcome, timings)
+                passed_count += passed
+                perf_rows.extend(timings.get("perf", []))
+                measured.add(timings.get("coverage", []))
+                if outcome == "passed" and not KEEP_PASSING_SCRATCH:
+                    shutil.rmtree(workdir, ignore_errors=True)
+                if critical:
+                    stopped = True
+                    for other in pending:
+                        other.cancel()  # stops their simulators
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    return
+
+    if args.async_sims:
+        asyncio.run(run_async())
+    elif workers == 1:
+        for batch in batches:
+            test_num, N, M, Num_Seq, seed = batch
+            if skip(batch):
+                skipped_count += 1
+                continue
+            total_run_actual += 1
+            logging.info(f"--- Running Test Batch {test_num}/{num_tests} ---")
+            logging.info(f"Parameters: N={N}, M={M}, Num_Sequences={Num_Seq}, Seed={seed}")
+            outcome, timings = run_test_batch(N, M, Num_Seq, seed,
+                                              profile_prefix=profile_prefix(f"test_{test_num:04d}"))
+            passed, critical = report(batch, outcome, timings)
+            passed_count += passed
+            perf_rows.extend(timings.get("perf", []))
+            measured.add(timings.get("coverage", []))
+            if critical:
+                stopped = True
+                break
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                    initializer=_init_worker,
+                                                    initargs=(worker_settings(),)) as pool:
+            futures = {}
+            for test_num, N, M, Num_Seq, seed in batches:
+                if (N, M, Num_Seq, seed) in done:
+                    continue
+                workdir = os.path.abspath(os.path.join(SCRATCH_ROOT, f"test_{test_num:04d}"))
+                futures[test_num] = pool.submit(_run_test_in_worker, N, M, Num_Seq, seed, workdir,
+                                                profile_prefix(f"test_{test_num:04d}"))
+
+            # Collect in test order so the log reads the same as a serial run
+            for batch in batches:
+                test_num, N, M, Num_Seq, seed = batch
+                if skip(batch):
+                    skipped_count += 1
+                    continue
+                try:
+                    outcome, timings, records = futures[test_num].result()
+                except Exception as e:
+                    outcome, timings, records = "sim", {}, [(logging.ERROR, f"Worker failed: {e}")]
+                total_run_actual += 1
+                logging.info(f"--- Running Test Batch {test_num}/{num_tests} ---")
+                logging.info(f"Parameters: N={N}, M={M}, Num_Sequences={Num_Seq}, Seed={seed}")
+                for level, msg in records:
+                    logging.log(level, msg)
+                passed, critical = report(batch, outcome, timings)
+                passed_count += passed
+                perf_rows.extend(timings.get("perf", []))
+                measured.add(timings.get("coverage", []))
+                if critical:
+                    stopped = True
+                    for f in futures.values():
+                        f.cancel()
+                    break
 
     # 6. Final Summary
     logging.info("\n" + "="*50)
@@ -271,13 +929,42 @@ def main():
     logging.info(f"Total Tests Run: {total_run_actual}")
     logging.info(f"Passed: {passed_count}")
     logging.info(f"Failed: {failed_count}")
+    if skipped_count:
+        logging.info(f"Skipped (passed before with this DUT): {skipped_count}")
     
     if total_run_actual > 0:
         pass_rate = (passed_count / total_run_actual) * 100
         logging.info(f"Pass Rate: {pass_rate:.2f}%")
+
+    if BSV_BUILD_ONCE:
+        logging.info(f"Simulator Compile Time: {compile_seconds:.2f}s")
+    if phase_rows:
+        phase_timing.write_csv(PHASE_TIMINGS_FILE, phase_rows)
+        logging.info(f"Phase times over {len(phase_rows)} tests (per batch in {PHASE_TIMINGS_FILE}):")
+        logging.info(phase_timing.format_summary(phase_timing.summarize(phase_rows)))
+    if PROFILE and phase_rows:
+        merged = phase_timing.merge_profiles(
+            (profile_prefix(f"test_{row['test']:04d}") for row in phase_rows), PROFILE_DIR)
+        if merged:
+            logging.info(f"Profiles merged into {PROFILE_DIR}/: {', '.join(p + '.prof' for p in merged)}")
+    if perf_rows:
+        perf_report.write_rows_csv(PERF_ROWS_FILE, perf_rows)
+        logging.info(f"DUT performance by N and M ({len(perf_rows)} sequences, rows in {PERF_ROWS_FILE}):")
+        logging.info(perf_report.format_summary(perf_report.summarize(perf_rows)))
         
+    if total_run_actual:
+        logging.info(measured.report())
+        measured.save(COVERAGE_FILE)
+        logging.info(f"Coverage saved to {COVERAGE_FILE}")
+
+    if store:
+        if not stopped:
+            store.finish_session(session_id)
+        store.close()
+        logging.info(f"Results recorded in {RESULTS_DB} (session {session_id})")
+
     logging.info("="*50)
     logging.info(f"Full log available at: {LOG_FILE}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
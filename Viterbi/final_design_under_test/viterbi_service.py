@@ -0,0 +1,336 @@
+"""
+viterbi_service.py
+
+Long-lived, multi-model decoding service on top of golden_viterbi.py.
+
+Models (N, M, A_start, A_trans, B) are registered once, prepared (float32,
+contiguous, B transposed) and kept resident, keyed by their content hash
+(golden_viterbi.model_key) and optionally by a name. Decode requests name a
+model and return a Future. A dispatcher thread groups the pending requests of
+each model into one batch (up to max_batch_sequences sequences, collected for
+batch_window seconds) and runs it on a thread or process pool, so many small
+requests against the same model cost one vectorized run_viterbi_batch call.
+
+API:
+    with DecodingService(workers=4) as service:
+        service.load_model("awgn", "models/awgn")      # N.dat, A.dat, B.dat
+        key = service.add_model(N, M, A_start, A_trans, B, name="rayleigh")
+        future = service.submit("awgn", sequences)     # or by key
+        paths_and_logprobs = future.result()
+
+Server mode (JSON lines on stdin, one response line per request on stdout, in
+completion order):
+    python viterbi_service.py --model awgn=models/awgn --model rayleigh=models/rayleigh
+    {"id": 1, "model": "awgn", "sequences": [[1, 2, 3], [4, 5]]}
+    {"id": 2, "op": "load", "name": "fading", "dir": "models/fading"}
+    {"id": 3, "op": "models"}
+Decode responses carry one {"path": [...], "logprob": "<float32 hex>"} per
+sequence, as written to output_p.dat; failures carry "error".
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import golden_viterbi
+
+# --- CONFIGURATION ---
+MAX_BATCH_SEQUENCES = 4096  # sequences merged into one decode call at most
+BATCH_WINDOW_SECONDS = 0.002  # how long the dispatcher waits to collect more requests
+EXECUTORS = ("thread", "process")
+# --- END CONFIGURATION ---
+
+Result = Tuple[List[int], float]
+
+def read_model_dir(model_dir: str) -> Tuple[int, int, np.ndarray, np.ndarray, np.ndarray]:
+    """(N, M, A_start, A_trans, B) from the N.dat, A.dat and B.dat in `model_dir`."""
+    N, M = golden_viterbi.read_N_file(os.path.join(model_dir, "N.dat"))
+    if N <= 0 or M <= 0:
+        raise RuntimeError(f"{model_dir}: invalid N or M")
+    A_start, A_trans = golden_viterbi.read_A_file(os.path.join(model_dir, "A.dat"), N)
+    B = golden_viterbi.read_B_file(os.path.join(model_dir, "B.dat"), N, M)
+    return N, M, A_start, A_trans, B
+
+def _decode_batch(model: golden_viterbi.ViterbiModel, sequences, engine: Optional[str],
+                  normalize: bool, tie_break: str) -> List[Result]:
+    """Pool entry point (module level so process pools can pickle it)."""
+    return golden_viterbi.decode_prepared(model, sequences, engine, normalize, tie_break)
+
+class _Request:
+    __slots__ = ("sequences", "future")
+
+    def __init__(self, sequences, future: concurrent.futures.Future):
+        self.sequences = sequences
+        self.future = future
+
+class DecodingService:
+    """Keeps prepared models resident and batches decode requests per model.
+
+    workers: pool size (0 = all cores). executor: "thread" (models shared,
+    NumPy and the numba kernel release the GIL for most of the work) or
+    "process" (each batch ships its model to the worker). engine, normalize
+    and tie_break are passed to golden_viterbi.decode_prepared.
+    """
+
+    def __init__(self, workers: int = 0, executor: str = "thread",
+                 max_batch_sequences: int = MAX_BATCH_SEQUENCES,
+                 batch_window: float = BATCH_WINDOW_SECONDS, engine: Optional[str] = None,
+                 normalize: bool = False, tie_break: str = "first"):
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor '{executor}' (expected one of {', '.join(EXECUTORS)})")
+        if tie_break not in golden_viterbi.TIE_BREAKS:
+            raise ValueError(f"Unknown tie_break '{tie_break}' "
+                             f"(expected one of {', '.join(golden_viterbi.TIE_BREAKS)})")
+        golden_viterbi.select_engine(engine)  # fail early on an unavailable engine
+        workers = workers if workers > 0 else (os.cpu_count() or 1)
+        pool_cls = (concurrent.futures.ThreadPoolExecutor if executor == "thread"
+                    else concurrent.futures.ProcessPoolExecutor)
+        self._pool = pool_cls(max_workers=workers)
+        self._options = (engine, normalize, tie_break)
+        self.max_batch_sequences = max_batch_sequences
+        self.batch_window = batch_window
+
+        self._models: Dict[str, golden_viterbi.ViterbiModel] = {}
+        self._names: Dict[str, str] = {}
+        self._pending: "OrderedDict[str, List[_Request]]" = OrderedDict()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="viterbi-dispatch",
+                                            daemon=True)
+        self._dispatcher.start()
+
+    def __enter__(self) -> "DecodingService":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---- models ----
+
+    def add_model(self, N: int, M: int, A_start: np.ndarray, A_trans: np.ndarray, B: np.ndarray,
+                  name: Optional[str] = None) -> str:
+        """Prepare and register a model; returns its key. A name is rebound if already used."""
+        model = golden_viterbi.prepare_model(N, M, A_start, A_trans, B)
+        with self._cond:
+            self._models[model.key] = model
+            self._stats.setdefault(model.key, {"requests": 0, "batches": 0, "sequences": 0})
+            if name is not None:
+                self._names[name] = model.key
+        return model.key
+
+    def load_model(self, name: Optional[str], model_dir: str) -> str:
+        """Register the model stored as N.dat / A.dat / B.dat in `model_dir`."""
+        return self.add_model(*read_model_dir(model_dir), name=name)
+
+    def remove_model(self, model: str) -> None:
+        """Forget a model (by name or key) and every name bound to it; pending requests still run."""
+        with self._cond:
+            key = self._resolve(model)
+            del self._models[key]
+            for name in [n for n, k in self._names.items() if k == key]:
+                del self._names[name]
+
+    def models(self) -> Dict[str, Dict]:
+        """key -> {"names", "N", "M", and request / batch / sequence counts}."""
+        with self._cond:
+            return {key: {"names": sorted(n for n, k in self._names.items() if k == key),
+                          "N": m.N, "M": m.M, **self._stats[key]}
+                    for key, m in self._models.items()}
+
+    def _resolve(self, model: str) -> str:
+        key = self._names.get(model, model)
+        if key not in self._models:
+            raise KeyError(f"Unknown model '{model}'")
+        return key
+
+    # ---- requests ----
+
+    def submit(self, model: str, sequences) -> concurrent.futures.Future:
+        """Queue `sequences` (1-based observations) for decoding with `model` (name or key).
+
+        Returns a Future of one (path, log-probability) per sequence. Unknown
+        models and out-of-range observations raise here, not in the Future.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("DecodingService is closed")
+            key = self._resolve(model)
+            golden_viterbi.check_observations(sequences, self._models[key].M)
+            future: concurrent.futures.Future = concurrent.futures.Future()
+            self._pending.setdefault(key, []).append(_Request(list(sequences), future))
+            self._stats[key]["requests"] += 1
+            self._cond.notify()
+        return future
+
+    def decode(self, model: str, sequences) -> List[Result]:
+        """Blocking submit()."""
+        return self.submit(model, sequences).result()
+
+    def close(self) -> None:
+        """Stop accepting requests, finish the queued ones and shut the pool down."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._dispatcher.join()
+        self._pool.shutdown(wait=True)
+
+    # ---- dispatching ----
+
+    def _take_batch(self) -> Tuple[str, List[_Request]]:
+        """Pop the oldest model's requests, up to max_batch_sequences (at least one request)."""
+        key, queue = next(iter(self._pending.items()))
+        taken, count = [], 0
+        while queue and (not taken or count + len(queue[0].sequences) <= self.max_batch_sequences):
+            req = queue.pop(0)
+            taken.append(req)
+            count += len(req.sequences)
+        if queue:
+            self._pending.move_to_end(key)
+        else:
+            del self._pending[key]
+        return key, taken
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+            if self.batch_window > 0 and not self._closed:
+                time.sleep(self.batch_window)  # let requests for the same model accumulate
+            with self._cond:
+                batches = []
+                while self._pending:
+                    key, requests = self._take_batch()
+                    batches.append((self._models.get(key), key, requests))
+            for model, key, requests in batches:
+                self._run(model, key, requests)
+
+    def _run(self, model: Optional[golden_viterbi.ViterbiModel], key: str,
+             requests: List[_Request]) -> None:
+        requests = [r for r in requests if r.future.set_running_or_notify_cancel()]
+        if not requests:
+            return
+        if model is None:
+            for r in requests:
+                r.future.set_exception(KeyError(f"Model '{key}' was removed"))
+            return
+        sequences = [seq for r in requests for seq in r.sequences]
+        with self._cond:
+            self._stats[key]["batches"] += 1
+            self._stats[key]["sequences"] += len(sequences)
+        try:
+            job = self._pool.submit(_decode_batch, model, sequences, *self._options)
+        except Exception as e:
+            for r in requests:
+                r.future.set_exception(e)
+            return
+        job.add_done_callback(lambda done: self._deliver(done, requests))
+
+    @staticmethod
+    def _deliver(done: concurrent.futures.Future, requests: List[_Request]) -> None:
+        """Split a batch's results back into its requests' futures."""
+        error = done.exception()
+        if error is not None:
+            for r in requests:
+                r.future.set_exception(error)
+            return
+        results, start = done.result(), 0
+        for r in requests:
+            r.future.set_result(results[start:start + len(r.sequences)])
+            start += len(r.sequences)
+
+# ---- server mode ----
+
+def _error_text(e: Exception) -> str:
+    return str(e.args[0]) if isinstance(e, KeyError) and e.args else str(e)
+
+def _decode_response(req_id, future: concurrent.futures.Future) -> Dict:
+    try:
+        results = future.result()
+    except Exception as e:
+        return {"id": req_id, "error": _error_text(e)}
+    return {"id": req_id, "results": [{"path": [int(s) for s in path],
+                                       "logprob": golden_viterbi.float32_to_hex32(lp)}
+                                      for path, lp in results]}
+
+def serve(service: DecodingService, fin, fout) -> int:
+    """Answer JSON-line requests from `fin` on `fout` until EOF; returns the number handled."""
+    lock = threading.Lock()
+    handled = 0
+
+    def respond(obj: Dict) -> None:
+        with lock:
+            fout.write(json.dumps(obj) + "\n")
+            fout.flush()
+
+    outstanding = []
+    for line in fin:
+        if not line.strip():
+            continue
+        handled += 1
+        req_id = None
+        try:
+            req = json.loads(line)
+            req_id = req.get("id")
+            op = req.get("op", "decode")
+            if op == "decode":
+                future = service.submit(req["model"], req["sequences"])
+                future.add_done_callback(lambda f, i=req_id: respond(_decode_response(i, f)))
+                outstanding.append(future)
+            elif op == "load":
+                respond({"id": req_id, "key": service.load_model(req.get("name"), req["dir"])})
+            elif op == "models":
+                respond({"id": req_id, "models": service.models()})
+            else:
+                raise ValueError(f"Unknown op '{op}'")
+        except Exception as e:
+            respond({"id": req_id, "error": _error_text(e)})
+    concurrent.futures.wait(outstanding)
+    return handled
+
+# ---- main flow ----
+
+def parse_args(argv=None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Serve Viterbi decoding for several resident models (JSON lines on stdin/stdout)")
+    ap.add_argument("--model", action="append", default=[], metavar="NAME=DIR",
+                    help="register the model in DIR (N.dat, A.dat, B.dat) as NAME; repeatable")
+    ap.add_argument("--workers", type=int, default=0, help="pool size (0 = all cores)")
+    ap.add_argument("--executor", choices=EXECUTORS, default="thread")
+    ap.add_argument("--batch-window", type=float, default=BATCH_WINDOW_SECONDS,
+                    help="seconds to collect requests for the same model before decoding")
+    ap.add_argument("--engine", choices=golden_viterbi.ENGINES, default=None)
+    ap.add_argument("--normalize", action="store_true")
+    ap.add_argument("--tie-break", choices=golden_viterbi.TIE_BREAKS, default="first")
+    return ap.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    with DecodingService(args.workers, args.executor, batch_window=args.batch_window,
+                         engine=args.engine, normalize=args.normalize,
+                         tie_break=args.tie_break) as service:
+        for spec in args.model:
+            name, sep, model_dir = spec.partition("=")
+            if not sep:
+                print(f"Error: --model expects NAME=DIR, got '{spec}'", file=sys.stderr)
+                return 2
+            key = service.load_model(name, model_dir)
+            print(f"Loaded model '{name}' ({key[:12]}) from {model_dir}", file=sys.stderr)
+        handled = serve(service, sys.stdin, sys.stdout)
+    print(f"Handled {handled} requests.", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())